@@ -1,4 +1,5 @@
 class Attribute:
-    def __init__(self, name: str, data_type: str):
+    def __init__(self, name: str, data_type: str, nullable: bool = False):
         self.name = name
         self.data_type = data_type  # e.g., 'integer', 'real', 'char', etc.
+        self.nullable = nullable  # True if the attribute may hold None (e.g. unmatched side of a left join)
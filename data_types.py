@@ -1,5 +1,6 @@
 # data_types.py
 import datetime
+import functools
 import os
 
 SUPPORTED_DATA_TYPES = {'int','str','integer', 'real', 'char', 'string', 'date', 'int_interval', 'file'}
@@ -7,60 +8,102 @@ SUPPORTED_DATA_TYPES = {'int','str','integer', 'real', 'char', 'string', 'date',
 # data_types.py
 
 
+def _parse_integer(value):
+    return int(value)
+
+
+def _parse_real(value):
+    return float(value)
+
+
+def _parse_char(value):
+    if len(value) == 1:
+        return value
+    else:
+        raise ValueError("Char must be a single character.")
+
+
+def _parse_string(value):
+    return str(value)
+
+
+def _parse_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    elif isinstance(value, str):
+        try:
+            return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError as e:
+            raise ValueError(f"Invalid date format: {value}. Expected 'YYYY-MM-DD'.") from e
+    else:
+        raise TypeError(f"Expected str or datetime.date for data_type 'date', got {type(value).__name__}")
+
+
+def _parse_int_interval(value):
+    if isinstance(value, tuple):
+        if len(value) != 2:
+            raise ValueError("Int interval tuple must have exactly two elements.")
+        start_int, end_int = value
+        if not isinstance(start_int, int) or not isinstance(end_int, int):
+            raise TypeError("Both elements of the tuple must be int.")
+        return f"{start_int} to {end_int}"
+
+    elif isinstance(value, str):
+        ints = value.split(' to ')
+        if len(ints) != 2:
+            raise ValueError("Int interval must be in int to int format.")
+        try:
+            start_int = ints[0]
+            end_int = ints[1]
+        except ValueError as e:
+            raise ValueError("Invalid int format. Use int digits.") from e
+        return f"{start_int} to {end_int}"
+    else:
+        raise TypeError("Value must be either a tuple of two ints or a string in 'int to int' format.")
+
+
+# Dispatch table: data type -> function converting a non-empty raw value
+PARSERS = {
+    'integer': _parse_integer,
+    'int': _parse_integer,
+    'real': _parse_real,
+    'char': _parse_char,
+    'string': _parse_string,
+    'str': _parse_string,
+    'file': _parse_string,
+    'date': _parse_date,
+    'int_interval': _parse_int_interval,
+}
+
+
+def _parse_unknown(data_type):
+    def parse(value):
+        raise ValueError(f"Unknown data type: {data_type}")
+    return parse
+
+
+@functools.lru_cache(maxsize=None)
+def get_parser(data_type, nullable=False):
+    """Return a one-argument function with the same behaviour as parse_data(value, data_type).
+
+    A nullable parser turns empty values into None instead of rejecting them.
+    """
+    convert = PARSERS.get(data_type) or _parse_unknown(data_type)
+
+    def parse(value):
+        if value is None or value == '':
+            if nullable:
+                return None
+            raise ValueError(f"Value cannot be empty. Expected {data_type}.")
+        try:
+            return convert(value)
+        except ValueError as e:
+            raise ValueError(f"Error parsing value '{value}' as {data_type}: {e}")
+    return parse
+
+
 def parse_data(value, data_type):
-    if value is None or value == '':
-        raise ValueError(f"Value cannot be empty. Expected {data_type}.")
-    try:
-        if data_type == 'integer' or data_type == 'int':
-            return int(value)
-        elif data_type == 'real':
-            return float(value)
-        elif data_type == 'char':
-            if len(value) == 1:
-                return value
-            else:
-                raise ValueError("Char must be a single character.")
-        elif data_type == 'string' or data_type == 'str':
-            return str(value)
-        elif data_type == 'file':
-            return str(value)
-        elif data_type == 'date':
-            if isinstance(value, datetime.date):
-                return value
-            elif isinstance(value, str):
-                try:
-                    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
-                except ValueError as e:
-                    raise ValueError(f"Invalid date format: {value}. Expected 'YYYY-MM-DD'.") from e
-            else:
-                raise TypeError(f"Expected str or datetime.date for data_type 'date', got {type(value).__name__}")
-        elif data_type == 'int_interval':
-            if isinstance(value, tuple):
-                if len(value) != 2:
-                    raise ValueError("Int interval tuple must have exactly two elements.")
-                start_int, end_int = value
-                if not isinstance(start_int, int) or not isinstance(end_int, int):
-                    raise TypeError("Both elements of the tuple must be int.")
-                return f"{start_int} to {end_int}"
-
-            elif isinstance(value, str):
-                ints = value.split(' to ')
-                if len(ints) != 2:
-                    raise ValueError("Int interval must be in int to int format.")
-                try:
-                    start_int = ints[0]
-                    end_int = ints[1]
-                except ValueError as e:
-                    raise ValueError("Invalid int format. Use int digits.") from e
-                return f"{start_int} to {end_int}"
-            else:
-                raise TypeError("Value must be either a tuple of two ints or a string in 'int to int' format.")
-        else:
-            raise ValueError(f"Unknown data type: {data_type}")
-    except ValueError as e:
-        raise ValueError(f"Error parsing value '{value}' as {data_type}: {e}")
-    finally:
-        pass
+    return get_parser(data_type)(value)
     
 # def parse_text_file(file_path):
 #     if not os.path.isfile(file_path):
@@ -73,4 +116,4 @@ def validate_data(value, data_type):
         parse_data(value, data_type)
         return True
     except ValueError:
-        return False
\ No newline at end of file
+        return False
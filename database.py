@@ -1,17 +1,36 @@
 # database.py
-from table import Table
+from table import Table, next_version
 from table import Schema
 # database.py
 class Database:
     def __init__(self, name: str):
         self.name = name
         self.tables = {}  # Key: Table name, Value: Table instance
+        self.version = next_version()  # Replaced on every table added, renamed or removed, and on every table change
+
+    def _touch(self, table=None, event=None, data=None):
+        self.version = next_version()
 
     def create_table(self, table: Table):
         if table.name in self.tables:
             raise ValueError(f"Table '{table.name}' already exists in database '{self.name}'.")
         self.tables[table.name] = table
+        table.subscribe(self._touch)
+        self._touch()
 
     def get_table(self, table_name: str) -> Table:
         return self.tables.get(table_name)
 
+    def rename_table(self, table_name: str, new_name: str):
+        if new_name in self.tables:
+            raise ValueError(f"Table '{new_name}' already exists in database '{self.name}'.")
+        table = self.tables.pop(table_name)
+        table.name = new_name
+        self.tables[new_name] = table
+        self._touch()
+
+    def drop_table(self, table_name: str) -> Table:
+        table = self.tables.pop(table_name)
+        table.unsubscribe(self._touch)
+        self._touch()
+        return table
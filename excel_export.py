@@ -0,0 +1,185 @@
+# excel_export.py
+import os
+import re
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import chain, islice
+from urllib.parse import quote
+
+from operations import POOL_CONTEXT
+
+# Excel export without a DataFrame: rows go one at a time into an openpyxl
+# write-only workbook, which keeps each sheet in a temporary file instead of
+# in memory. An .xlsx file is a zip archive whose directory is written last,
+# so HTTP exports build it in a spooled temporary file (memory first, disk
+# once it grows) and stream that out in chunks; nothing is left on disk and
+# concurrent exports of the same table never share a path.
+#
+# Exports of many tables are built in a process pool from picklable column
+# buffers (never Table objects, which carry listeners) and streamed back as
+# one ZIP archive, each workbook added as soon as its worker finishes.
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXCEL_MAX_ROWS = 1048576  # Rows per sheet, header row included
+SPOOL_MAX_BYTES = 16 * 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+PROGRESS_INTERVAL = 10000
+
+_INVALID_TITLE_CHARS = re.compile(r'[\[\]:*?/\\]')
+_END = object()
+
+
+def sheet_title(name: str, index: int = 0) -> str:
+    """Valid sheet title for part `index` of an export: at most 31 characters, "name (2)" for the second part."""
+    suffix = f" ({index + 1})" if index else ""
+    name = _INVALID_TITLE_CHARS.sub('_', name).strip("'") or "Sheet"
+    return name[:31 - len(suffix)] + suffix
+
+
+def split_sheets(rows_values, title: str, max_rows: int = EXCEL_MAX_ROWS):
+    """Yield (sheet title, rows) parts of at most max_rows - 1 data rows each; always at least one part.
+
+    Parts are lazy slices of `rows_values`: consume each before asking for the next.
+    """
+    per_sheet = max_rows - 1  # The header takes one row of every sheet
+    iterator = iter(rows_values)
+    index = 0
+    while True:
+        yield sheet_title(title, index), islice(iterator, per_sheet)
+        first = next(iterator, _END)
+        if first is _END:
+            return
+        iterator = chain([first], iterator)
+        index += 1
+
+
+def write_xlsx(names, rows_values, file, title: str = "Sheet", progress=None) -> int:
+    """Write value tuples to an .xlsx file given as a path or a binary file object.
+
+    Tables beyond Excel's row limit continue on further sheets, each with the
+    header row. `progress(rows written)` is called periodically. Returns the
+    number of data rows written.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    header = list(names)
+    written = 0
+    for part_title, rows in split_sheets(rows_values, title):
+        sheet = workbook.create_sheet(part_title)
+        sheet.append(header)
+        for values in rows:
+            sheet.append(list(values))
+            written += 1
+            if progress is not None and written % PROGRESS_INTERVAL == 0:
+                progress(written)
+    workbook.save(file)
+    return written
+
+
+def spooled_xlsx(names, rows_values, title: str = "Sheet"):
+    """An .xlsx workbook in a spooled temporary file, rewound for reading."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    try:
+        write_xlsx(names, rows_values, spool, title)
+        spool.seek(0)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+
+def iter_file(file, chunk_size: int = STREAM_CHUNK_SIZE):
+    """Yield a file's contents in chunks and close it afterwards."""
+    try:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        file.close()
+
+
+def attachment_headers(filename: str) -> dict:
+    """Content-Disposition for a download, with an RFC 5987 form for non-ASCII names."""
+    fallback = filename.encode('ascii', 'replace').decode('ascii').replace('"', '_')
+    return {"Content-Disposition": f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}"}
+
+
+def _workbook_file(names, title: str, columns: list) -> str:
+    # Process pool task: write column buffers to a temporary workbook and return its path
+    file = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
+    try:
+        with file:
+            write_xlsx(names, zip(*[column.values() for column in columns]), file, title)
+    except BaseException:
+        os.remove(file.name)
+        raise
+    return file.name
+
+
+class _ZipOutput:
+    """Unseekable sink for zipfile.ZipFile; written bytes are taken out with take()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _add_file(archive, output: _ZipOutput, name: str, path: str):
+    # Copy a finished workbook into the archive chunk by chunk, then delete it
+    try:
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.file_size = os.path.getsize(path)  # Known up front, so large entries get ZIP64 headers
+        with open(path, 'rb') as source, archive.open(info, 'w') as entry:  # Stored: .xlsx is compressed already
+            for chunk in iter(lambda: source.read(STREAM_CHUNK_SIZE), b''):
+                entry.write(chunk)
+                data = output.take()
+                if data:
+                    yield data
+    finally:
+        os.remove(path)
+
+
+def zip_workbooks(jobs, workers: int, build=_workbook_file):
+    """Yield the bytes of a ZIP archive holding one workbook per job, built by `workers` processes.
+
+    `jobs` yields (entry name, attribute names, sheet title, column buffers)
+    and is read lazily, so at most 2 * workers tables are copied out at a time.
+    `build(names, title, columns)`, a module-level function, returns the path
+    of a finished temporary file. Entries appear in the order they are finished.
+    """
+    jobs = iter(jobs)
+    output = _ZipOutput()
+    pending = {}  # Future -> entry name
+    with ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT) as executor:
+        try:
+            with zipfile.ZipFile(output, 'w') as archive:
+                while True:
+                    for name, names, title, columns in islice(jobs, 2 * workers - len(pending)):
+                        pending[executor.submit(build, names, title, columns)] = name
+                    if not pending:
+                        break
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from _add_file(archive, output, pending.pop(future), future.result())
+            yield output.take()  # The central directory, written when the archive closes
+        finally:
+            # Stopped early (error or client gone): drop work that is queued or already written
+            for future in pending:
+                if not future.cancel() and future.exception() is None:
+                    os.remove(future.result())
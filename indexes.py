@@ -0,0 +1,111 @@
+# indexes.py
+import operator
+from bisect import bisect_left, bisect_right, insort
+from math import inf
+
+# Secondary indexes map attribute values to stable row ids. Tables keep them
+# up to date on every insert, update and delete; None values are not indexed
+# (no comparison ever matches them).
+
+ORDERED_TYPES = {'integer', 'int', 'real', 'date'}
+
+COMPARISONS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+class HashIndex:
+    """Equality lookups in O(1): value -> set of row ids."""
+    kind = 'hash'
+    operators = {'='}
+
+    def __init__(self, attribute: str):
+        self.attribute = attribute
+        self._ids = {}
+
+    def add(self, value, row_id: int):
+        if value is not None:
+            self._ids.setdefault(value, set()).add(row_id)
+
+    def bulk_load(self, values, row_ids):
+        """Add many (value, row id) pairs at once."""
+        ids = self._ids
+        for value, row_id in zip(values, row_ids):
+            if value is not None:
+                if value in ids:
+                    ids[value].add(row_id)
+                else:
+                    ids[value] = {row_id}
+
+    def remove(self, value, row_id: int):
+        if value is not None:
+            ids = self._ids[value]
+            ids.discard(row_id)
+            if not ids:
+                del self._ids[value]
+
+    def search(self, op: str, value) -> list:
+        return list(self._ids.get(value, ()))
+
+
+class SortedIndex:
+    """Equality and range lookups in O(log n) over (value, row id) pairs kept in order."""
+    kind = 'sorted'
+    operators = {'=', '<', '<=', '>', '>='}
+
+    def __init__(self, attribute: str):
+        self.attribute = attribute
+        self._entries = []
+
+    def add(self, value, row_id: int):
+        if value is not None:
+            insort(self._entries, (value, row_id))
+
+    def bulk_load(self, values, row_ids):
+        """Add many (value, row id) pairs with one sort rather than an insort each."""
+        entries = sorted((value, row_id) for value, row_id in zip(values, row_ids) if value is not None)
+        if self._entries:
+            self._entries.extend(entries)
+            self._entries.sort()  # Two sorted runs: merged in linear time
+        else:
+            self._entries = entries
+
+    def remove(self, value, row_id: int):
+        if value is not None:
+            del self._entries[bisect_left(self._entries, (value, row_id))]
+
+    def range(self, low=None, high=None, include_low: bool = True, include_high: bool = True) -> list:
+        """Row ids with low <= value <= high in value order; either bound may be None (open)."""
+        entries = self._entries
+        if low is None:
+            start = 0
+        else:
+            start = bisect_left(entries, (low,)) if include_low else bisect_right(entries, (low, inf))
+        if high is None:
+            stop = len(entries)
+        else:
+            stop = bisect_right(entries, (high, inf)) if include_high else bisect_left(entries, (high,))
+        return [row_id for _, row_id in entries[start:stop]]
+
+    def search(self, op: str, value) -> list:
+        if op == '=':
+            return self.range(value, value)
+        if op in ('<', '<='):
+            return self.range(high=value, include_high=op == '<=')
+        return self.range(low=value, include_low=op == '>=')
+
+
+INDEX_TYPES = {'hash': HashIndex, 'sorted': SortedIndex}
+
+
+def make_index(kind: str, attribute: str, data_type: str):
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {kind}")
+    if kind == 'sorted' and data_type not in ORDERED_TYPES:
+        raise ValueError(f"Sorted indexes need an integer, real or date attribute; '{attribute}' is {data_type}.")
+    return INDEX_TYPES[kind](attribute)
@@ -9,10 +9,14 @@ from table import Table
 from schema import Schema
 from attributes import Attribute
 from row import Row
-from operations import table_product
-from fastapi.responses import StreamingResponse
+from persistence import save_all, load_all
+from wal import WAL_FILE
+from operations import table_product, PRODUCT_ENGINES, hash_join, JOIN_TYPES
+from page_cache import PageCache
+from excel_export import XLSX_MEDIA_TYPE, spooled_xlsx, iter_file, attachment_headers
+from serialization import make_etag, etag_matches
+from fastapi.responses import StreamingResponse, HTMLResponse, Response
 import io
-from fastapi.responses import FileResponse
 import pandas as pd
 import os
 
@@ -27,6 +31,38 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # Initialize databases dictionary
 databases = {}  # Key: Database name, Value: Database instance
 
+# Snapshot directory: databases are loaded from it at startup and saved to it at shutdown.
+# It must not be the API server's directory: save_all() here knows nothing of its write-ahead log.
+DATA_DIR = os.environ.get("DB_WEB_DATA_DIR", "web_data")
+
+
+# Rendered pages: table pages are invalidated by table changes, catalog pages are keyed by their contents
+page_cache = PageCache()
+
+# Excel exports keyed by ETag (table version and name); larger workbooks are streamed and not kept
+export_cache = PageCache(64 * 1024 * 1024)
+EXPORT_CACHE_MAX_ENTRY = export_cache.max_bytes // 8
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def render_template(request: Request, name: str, context: dict) -> str:
+    return templates.get_template(name).render({"request": request, **context})
+
+
+@app.on_event("startup")
+def load_databases():
+    if os.path.exists(os.path.join(DATA_DIR, WAL_FILE)):
+        raise RuntimeError(f"'{DATA_DIR}' holds the API server's write-ahead log; set DB_WEB_DATA_DIR "
+                           f"to a directory of its own.")
+    databases.update(load_all(DATA_DIR))
+
+
+@app.on_event("shutdown")
+def save_databases():
+    save_all(databases, DATA_DIR, compress=os.environ.get("DB_SNAPSHOT_COMPRESS") == "1")
+
 
 
 
@@ -39,7 +75,7 @@ def get_all_tables():
 
 
 @app.get("/databases/{db_name}/tables/{table_name}/export")
-def export_table(db_name: str, table_name: str):
+def export_table(request: Request, db_name: str, table_name: str):
     db = databases.get(db_name)
     if not db:
         return RedirectResponse(f"/databases/{db_name}/tables/{table_name}", status_code=303)
@@ -47,22 +83,32 @@ def export_table(db_name: str, table_name: str):
     if not table:
         return RedirectResponse(f"/databases/{db_name}/tables/{table_name}", status_code=303)
 
-    # Convert table data to DataFrame
-    data = [row.data for row in table.rows]
-    df = pd.DataFrame(data)
-
-    # Save DataFrame to Excel file
-    file_path = f"exports/{db_name}_{table_name}.xlsx"
-    os.makedirs("exports", exist_ok=True)
-    df.to_excel(file_path, index=False)
-
-    # Return the file as a response
-    return FileResponse(path=file_path, filename=f"{table_name}.xlsx",
-                        media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    # An unchanged table version means an unchanged workbook
+    etag = make_etag(table.version, table_name, XLSX_MEDIA_TYPE)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    headers = {"ETag": etag, **attachment_headers(f"{table_name}.xlsx")}
+    body = export_cache.get(etag)
+    if body is not None:
+        return Response(body, media_type=XLSX_MEDIA_TYPE, headers=headers)
+
+    # Built in a spooled temporary file, so concurrent exports never share a path
+    with table.snapshot() as snapshot:
+        spool = spooled_xlsx(table.schema.names, (values for _, values in snapshot.find()), title=table_name)
+    if spool.seek(0, os.SEEK_END) > EXPORT_CACHE_MAX_ENTRY:
+        spool.seek(0)
+        return StreamingResponse(iter_file(spool), media_type=XLSX_MEDIA_TYPE, headers=headers)
+    spool.seek(0)
+    with spool:
+        body = spool.read()
+    export_cache.put(etag, body)
+    return Response(body, media_type=XLSX_MEDIA_TYPE, headers=headers)
 
 @app.get("/")
 def read_root(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request, "databases": databases})
+    key = ("index", str(request.base_url), tuple(databases))
+    return HTMLResponse(page_cache.render(key, lambda: render_template(request, "index.html",
+                                                                       {"databases": databases})))
 
 
 @app.get("/create_database")
@@ -74,7 +120,7 @@ def get_create_database(request: Request):
 def delete_table(request: Request, db_name: str, table_name: str):
     db = databases.get(db_name)
     if db and table_name in db.tables:
-        del db.tables[table_name]
+        db.drop_table(table_name)
     return RedirectResponse(f"/databases/{db_name}", status_code=303)
 
 
@@ -127,9 +173,7 @@ def post_edit_table(request: Request, db_name: str, table_name: str, new_table_n
         if new_table_name != table_name:
             if new_table_name in db.tables:
                 raise ValueError(f"Table '{new_table_name}' already exists in database '{db_name}'.")
-            del db.tables[table_name]
-            table.name = new_table_name
-            db.tables[new_table_name] = table
+            db.rename_table(table_name, new_table_name)
     except Exception as e:
         return templates.TemplateResponse("edit_table.html",
                                           {"request": request, "error": str(e), "db_name": db_name, "table": table,
@@ -152,7 +196,8 @@ def view_database(request: Request, db_name: str):
     if not db:
         return templates.TemplateResponse("error.html",
                                           {"request": request, "error": f"Database '{db_name}' not found."})
-    return templates.TemplateResponse("database.html", {"request": request, "db": db})
+    key = ("database", str(request.base_url), db.name, tuple(db.tables))
+    return HTMLResponse(page_cache.render(key, lambda: render_template(request, "database.html", {"db": db})))
 
 
 @app.get("/databases/{db_name}/create_table")
@@ -189,7 +234,7 @@ def post_create_table(request: Request, db_name: str, table_name: str = Form(...
 
 
 @app.get("/databases/{db_name}/tables/{table_name}")
-def view_table(request: Request, db_name: str, table_name: str):
+def view_table(request: Request, db_name: str, table_name: str, page: int = 1, page_size: int = DEFAULT_PAGE_SIZE):
     db = databases.get(db_name)
     if not db:
         return templates.TemplateResponse("error.html", {
@@ -202,11 +247,28 @@ def view_table(request: Request, db_name: str, table_name: str):
             "request": request,
             "error": f"Table '{table_name}' not found in database '{db_name}'."
         })
-    return templates.TemplateResponse("view_table.html", {
-        "request": request,
+    # Only one page of rows is rendered; pages are cached until the table changes
+    version = table.version
+    page_size = min(max(page_size, 1), MAX_PAGE_SIZE)
+    total = table.row_count()
+    page_count = max(1, -(-total // page_size))
+    page = min(max(page, 1), page_count)
+    start = (page - 1) * page_size
+    etag = make_etag(version, str(request.base_url), db_name, table_name, page, page_size)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    key = ("table", str(request.base_url), db_name, table_name, page_cache.table_token(table), page, page_size)
+    html = page_cache.render(key, lambda: render_template(request, "view_table.html", {
         "db_name": db_name,
-        "table": table
-    })
+        "table": table,
+        "rows": table.rows[start:start + page_size],
+        "start": start,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "page_count": page_count
+    }))
+    return HTMLResponse(html, headers={"X-Total-Count": str(total), "ETag": etag})
 
 
 @app.get("/databases/{db_name}/tables/{table_name}/insert_row")
@@ -270,7 +332,7 @@ async def post_insert_row(request: Request, db_name: str, table_name: str):
             "form_data": form_data
         })
     row = Row(parsed_data)
-    table.insert_row(row)
+    table.insert_row(row, trusted=True)
     return RedirectResponse(f"/databases/{db_name}/tables/{table_name}", status_code=303)
 
 
@@ -289,7 +351,8 @@ def post_product_tables(request: Request,
                         table1_fullname: str = Form(...),
                         table2_fullname: str = Form(...),
                         destination_db_name: str = Form(...),
-                        new_table_name: str = Form(...)):
+                        new_table_name: str = Form(...),
+                        engine: str = Form("python")):
     db1_name, table1_name = table1_fullname.split('.')
     db2_name, table2_name = table2_fullname.split('.')
 
@@ -320,14 +383,85 @@ def post_product_tables(request: Request,
             "tables": get_all_tables(),
             "databases": databases
         })
+    if engine not in PRODUCT_ENGINES:
+        return templates.TemplateResponse("product_tables.html", {
+            "request": request,
+            "error": f"Unknown product engine: {engine}",
+            "tables": get_all_tables(),
+            "databases": databases
+        })
     # Create new table name with database name prefix
     full_table_name = f"{destination_db_name}_{new_table_name}"
-    new_table = table_product(table1, table2, full_table_name)
+    try:
+        new_table = table_product(table1, table2, full_table_name, engine=engine)
+    except ValueError as e:
+        return templates.TemplateResponse("product_tables.html", {
+            "request": request,
+            "error": str(e),
+            "tables": get_all_tables(),
+            "databases": databases
+        })
     destination_db.create_table(new_table)
     return RedirectResponse(f"/databases/{destination_db_name}", status_code=303)
 
 
 
+@app.get("/join_tables")
+def get_join_tables(request: Request):
+    return templates.TemplateResponse("join_tables.html", {
+        "request": request,
+        "tables": get_all_tables(),
+        "databases": databases
+    })
+
+
+@app.post("/join_tables")
+def post_join_tables(request: Request,
+                     table1_fullname: str = Form(...),
+                     table2_fullname: str = Form(...),
+                     on: str = Form(...),
+                     how: str = Form("inner"),
+                     destination_db_name: str = Form(...),
+                     new_table_name: str = Form(...)):
+    def render_error(error):
+        return templates.TemplateResponse("join_tables.html", {
+            "request": request,
+            "error": error,
+            "tables": get_all_tables(),
+            "databases": databases
+        })
+
+    try:
+        db1_name, table1_name = table1_fullname.split('.')
+        db2_name, table2_name = table2_fullname.split('.')
+    except ValueError:
+        return render_error("Table fullnames must be in 'db_name.table_name' format.")
+    db1 = databases.get(db1_name)
+    db2 = databases.get(db2_name)
+    destination_db = databases.get(destination_db_name)
+    if not db1 or not db2 or not destination_db:
+        return render_error("One or more databases not found.")
+    table1 = db1.get_table(table1_name)
+    table2 = db2.get_table(table2_name)
+    if not table1 or not table2:
+        return render_error("One or both tables not found.")
+    if new_table_name in destination_db.tables:
+        return render_error(f"Table '{new_table_name}' already exists in database '{destination_db_name}'.")
+    if how not in JOIN_TYPES:
+        return render_error(f"Unknown join type: {how}")
+    try:
+        # Join condition format: left_attr=right_attr, separated by commas
+        pairs = []
+        for condition in on.split(','):
+            left, right = condition.split('=')
+            pairs.append((left.strip(), right.strip()))
+        new_table = hash_join(table1, table2, pairs, new_table_name, how=how)
+    except ValueError as e:
+        return render_error(str(e))
+    destination_db.create_table(new_table)
+    return RedirectResponse(f"/databases/{destination_db_name}", status_code=303)
+
+
 @app.get("/databases/{db_name}/tables/{table_name}/edit_row/{row_index}")
 def get_edit_row(request: Request, db_name: str, table_name: str, row_index: int):
     db = databases.get(db_name)
@@ -391,7 +525,7 @@ async def post_edit_row(request: Request, db_name: str, table_name: str, row_ind
         })
 
     updated_row = Row(parsed_data)
-    table.update_row(row_index, updated_row)
+    table.update_row(row_index, updated_row, trusted=True)
     return RedirectResponse(f"/databases/{db_name}/tables/{table_name}", status_code=303)
 
 
@@ -443,33 +577,20 @@ def delete_row(request: Request, db_name: str, table_name: str, row_index: int):
         pass  # Ignore if row doesn't exist
     return RedirectResponse(f"/databases/{db_name}/tables/{table_name}", status_code=303)
 
-def find_duplicates(rows):
-    seen = set()
-    duplicates = []
-
-    for row in rows:
-        if row in seen:
-            duplicates.append(row)
-        else:
-            seen.add(row)
-
-    return duplicates
-
 @app.get("/databases/{db_name}/tables/{table_name}/delete_duplicate_rows")
-def  delete_duplicate_rows(request: Request, db_name: str, table_name: str):
+def  delete_duplicate_rows(request: Request, db_name: str, table_name: str, subset: str = None, keep: str = "first"):
     db = databases.get(db_name)
     if not db:
         return RedirectResponse(f"/databases/{db_name}/tables/{table_name}", status_code=303)
     table = db.get_table(table_name)
     if not table:
         return RedirectResponse(f"/databases/{db_name}/tables/{table_name}", status_code=303)
+    # subset: attribute names separated by commas; all attributes when omitted
+    attributes = [name.strip() for name in subset.split(',') if name.strip()] if subset else None
     try:
-        duplicates = find_duplicates(table.rows)
-        for row in duplicates: 
-            table.delete_row(row)
-
-    except IndexError:
-        pass  # Ignore if row doesn't exist
+        table.deduplicate(attributes, keep=keep)
+    except ValueError as e:
+        return templates.TemplateResponse("error.html", {"request": request, "error": str(e)})
     return RedirectResponse(f"/databases/{db_name}/tables/{table_name}", status_code=303)
 
 @app.get("/databases/{db_name}/tables/{table_name}/import_excel")
@@ -574,7 +695,7 @@ async def post_import_excel(request: Request, db_name: str, table_name: str, fil
         else:
             # Only insert row if no errors
             new_row = Row(parsed_data)
-            table.insert_row(new_row)
+            table.insert_row(new_row, trusted=True)
             inserted_rows += 1
 
     if errors:
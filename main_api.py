@@ -1,15 +1,26 @@
-from fastapi import FastAPI, HTTPException, Path, Query, Body
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Path, Query, Body, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
-from data_types import parse_data, SUPPORTED_DATA_TYPES
+from data_types import SUPPORTED_DATA_TYPES, get_parser
 from database import Database
-from table import Table
-from schema import Schema
+from table import Table, BulkInsertError
+from schema import Schema, SchemaValidationError
 from attributes import Attribute
 from row import Row
-from operations import table_product
-import pandas as pd
+from wal import DurableStore
+from serialization import (RowJsonCache, encode_json, DEFAULT_CACHE_BYTES, negotiate, encode_columnar,
+                           make_etag, etag_matches,
+                           JSON_MEDIA_TYPE, COLUMNAR_JSON_MEDIA_TYPE, COLUMNAR_BINARY_MEDIA_TYPE)
+from page_cache import PageCache
+from operations import table_product, ProductTable, PRODUCT_ENGINES, DEFAULT_CHUNK_SIZE, hash_join, JOIN_TYPES, chunked
+from itertools import islice
+from query import build_plan, materialize, fetch, parse_predicate
+from excel_export import XLSX_MEDIA_TYPE, spooled_xlsx, iter_file, attachment_headers, zip_workbooks
+import base64
+import functools
+import json
 import os
 
 app = FastAPI(title="Database Management API")
@@ -17,6 +28,52 @@ app = FastAPI(title="Database Management API")
 # Initialize databases dictionary
 databases: Dict[str, Database] = {}  # Key: Database name, Value: Database instance
 
+# Snapshot + write-ahead log directory: recovered at startup, checkpointed periodically and at shutdown
+DATA_DIR = os.environ.get("DB_DATA_DIR", "data")
+
+# Encoded JSON of recently read rows, shared by the row endpoints
+row_cache = RowJsonCache(int(os.environ.get("DB_ROW_CACHE_BYTES", DEFAULT_CACHE_BYTES)))
+
+# Generated export bodies keyed by ETag (table version, name and media type), in a byte-bounded LRU;
+# exports larger than an eighth of the cache are streamed without being kept
+export_cache = PageCache(int(os.environ.get("DB_EXPORT_CACHE_BYTES", 64 * 1024 * 1024)))
+EXPORT_CACHE_MAX_ENTRY = export_cache.max_bytes // 8
+
+# Upper limit on worker processes for /tables/export_all
+EXPORT_WORKERS = int(os.environ.get("DB_EXPORT_WORKERS", min(4, os.cpu_count() or 1)))
+# Upper limit on worker processes of one parallel table product
+PRODUCT_WORKERS = int(os.environ.get("DB_PRODUCT_WORKERS", os.cpu_count() or 1))
+
+store = DurableStore(databases, DATA_DIR,
+                     durability=os.environ.get("DB_DURABILITY", "group"),
+                     checkpoint_interval=float(os.environ.get("DB_CHECKPOINT_INTERVAL", "60")),
+                     compress=os.environ.get("DB_SNAPSHOT_COMPRESS") == "1")
+
+
+@app.on_event("startup")
+def load_databases():
+    store.open()
+
+
+@app.on_event("shutdown")
+def save_databases():
+    store.close()
+
+
+def durable_write(endpoint):
+    """Decorator for mutating endpoints: runs the endpoint as one logged transaction.
+
+    The lock is taken in the endpoint's own worker thread, so a request waiting
+    for it never holds a second thread-pool token. Endpoints that compute a
+    result first (products, joins, queries) use store.transaction() around the
+    catalog change only.
+    """
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        with store.transaction():
+            return endpoint(*args, **kwargs)
+    return wrapper
+
 
 # Pydantic Models
 
@@ -27,6 +84,7 @@ class AttributeModel(BaseModel):
 
 class SchemaModel(BaseModel):
     attributes: List[AttributeModel]
+    primary_key: Optional[str] = None  # Name of a unique attribute used by the /rows/by-key routes
 
 
 class TableModel(BaseModel):
@@ -43,6 +101,40 @@ class ProductTablesRequest(BaseModel):
     table2_fullname: str
     destination_db_name: str
     new_table_name: str
+    engine: str = "python"  # "python" (chunked rows) or "vectorized" (column-wise)
+    workers: Optional[int] = Field(None, ge=1, le=PRODUCT_WORKERS)  # More than 1 runs the product in a process pool
+    chunk_size: Optional[int] = Field(None, ge=1)  # Result rows per chunk / parallel task
+
+
+class JoinCondition(BaseModel):
+    left: str  # Attribute of table1
+    right: str  # Attribute of table2
+
+
+class JoinTablesRequest(BaseModel):
+    table1_fullname: str  # Format: "db_name.table_name"
+    table2_fullname: str
+    on: List[JoinCondition]
+    how: str = "inner"  # "inner" or "left"
+    destination_db_name: str
+    new_table_name: str
+
+
+class QueryRequest(BaseModel):
+    plan: Dict  # Operator tree, see query.build_plan
+    destination_db_name: Optional[str] = None  # Store the result instead of returning it
+    new_table_name: Optional[str] = None
+    limit: Optional[int] = Field(None, ge=1)  # Max rows returned when not storing
+
+
+class IndexModel(BaseModel):
+    attribute: str
+    kind: str = "hash"  # "hash" (equality) or "sorted" (equality and ranges; integer, real, date)
+
+
+class DeduplicateRequest(BaseModel):
+    subset: Optional[List[str]] = None  # Attributes to compare; all when omitted
+    keep: str = "first"  # "first" or "last"
 
 
 class CreateDatabaseRequest(BaseModel):
@@ -52,6 +144,7 @@ class CreateDatabaseRequest(BaseModel):
 class EditTableRequest(BaseModel):
     new_table_name: Optional[str] = None
     attributes: Optional[List[AttributeModel]] = None
+    primary_key: Optional[str] = None
 
 
 # Utility Functions
@@ -64,6 +157,47 @@ def get_all_tables():
     return all_tables
 
 
+def get_table_by_fullname(fullname: str) -> Table:
+    try:
+        db_name, table_name = fullname.split('.')
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Table fullnames must be in 'db_name.table_name' format.")
+    return find_table(db_name, table_name)
+
+
+def store_new_table(db_name: str, table: Table):
+    """Add a computed table (product, join or query result) to a database as one logged transaction.
+
+    The name checks made before computing are repeated under the lock.
+    """
+    with store.transaction():
+        db = databases.get(db_name)
+        if not db:
+            raise HTTPException(status_code=404, detail=f"Database '{db_name}' not found.")
+        if table.name in db.tables:
+            raise HTTPException(status_code=400,
+                                detail=f"Table '{table.name}' already exists in database '{db_name}'.")
+        db.create_table(table)
+        store.add_table(db, table)
+
+
+def not_modified(if_none_match: Optional[str], etag: str) -> Optional[Response]:
+    """A 304 response when the client already holds the representation tagged `etag`."""
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+def find_table(db_name: str, table_name: str) -> Table:
+    db = databases.get(db_name)
+    if not db:
+        raise HTTPException(status_code=404, detail=f"Database '{db_name}' not found.")
+    table = db.get_table(table_name)
+    if not table:
+        raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found in database '{db_name}'.")
+    return table
+
+
 # Database Endpoints
 
 @app.get("/databases", response_model=List[str])
@@ -73,25 +207,34 @@ def list_databases():
 
 
 @app.post("/databases", status_code=201)
+@durable_write
 def create_database(db: CreateDatabaseRequest):
     """Create a new database."""
     db_name = db.name
     if db_name in databases:
         raise HTTPException(status_code=400, detail=f"Database '{db_name}' already exists.")
     databases[db_name] = Database(db_name)
+    store.log('create_database', db=db_name)
     return {"message": f"Database '{db_name}' created successfully."}
 
 
 @app.get("/databases/{db_name}", response_model=Dict)
-def get_database(db_name: str = Path(..., description="Name of the database")):
+def get_database(response: Response, db_name: str = Path(..., description="Name of the database"),
+                 if_none_match: Optional[str] = Header(None)):
     """Get details of a specific database."""
     db = databases.get(db_name)
     if not db:
         raise HTTPException(status_code=404, detail=f"Database '{db_name}' not found.")
+    etag = make_etag(db.version, db.name)
+    cached = not_modified(if_none_match, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
     return {"name": db.name, "tables": list(db.tables.keys())}
 
 
 @app.put("/databases/{db_name}", response_model=Dict)
+@durable_write
 def edit_database(db_name: str, new_db_name: str = Query(..., description="New name for the database")):
     """Edit the name of a database."""
     if new_db_name == db_name:
@@ -104,14 +247,17 @@ def edit_database(db_name: str, new_db_name: str = Query(..., description="New n
     db.name = new_db_name
     databases[new_db_name] = db
     del databases[db_name]
+    store.log('rename_database', db=db_name, new_name=new_db_name)
     return {"message": f"Database renamed to '{new_db_name}' successfully."}
 
 
 @app.delete("/databases/{db_name}", response_model=Dict)
+@durable_write
 def delete_database(db_name: str):
     """Delete a database."""
     if db_name in databases:
         del databases[db_name]
+        store.log('delete_database', db=db_name)
         return {"message": f"Database '{db_name}' deleted successfully."}
     raise HTTPException(status_code=404, detail=f"Database '{db_name}' not found.")
 
@@ -128,6 +274,7 @@ def list_tables(db_name: str):
 
 
 @app.post("/databases/{db_name}/tables", status_code=201)
+@durable_write
 def create_table(db_name: str, table: TableModel):
     """Create a new table in a database."""
     db = databases.get(db_name)
@@ -142,9 +289,13 @@ def create_table(db_name: str, table: TableModel):
         if attr.data_type not in SUPPORTED_DATA_TYPES:
             raise HTTPException(status_code=400, detail=f"Unsupported data type: {attr.data_type}")
         attr_list.append(Attribute(attr.name, attr.data_type))
-    schema = Schema(attr_list)
+    try:
+        schema = Schema(attr_list, primary_key=table.table_schema.primary_key)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     new_table = Table(table_name, schema)
     db.create_table(new_table)
+    store.add_table(db, new_table)
     return {"message": f"Table '{table_name}' created successfully in database '{db_name}'."}
 
 
@@ -159,12 +310,16 @@ def get_table(db_name: str, table_name: str):
         raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found in database '{db_name}'.")
     return {
         "name": table.name,
-        "schema": [{"name": attr.name, "data_type": attr.data_type} for attr in table.schema.attributes],
+        "schema": [{"name": attr.name, "data_type": attr.data_type, "nullable": attr.nullable}
+                   for attr in table.schema.attributes],
+        "primary_key": table.schema.primary_key,
+        "indexes": table.indexes,
         "rows_count": len(table.rows)
     }
 
 
 @app.put("/databases/{db_name}/tables/{table_name}", response_model=Dict)
+@durable_write
 def edit_table(db_name: str, table_name: str, request: EditTableRequest = Body(...)):
     """Edit a table's name and/or schema."""
     db = databases.get(db_name)
@@ -184,47 +339,171 @@ def edit_table(db_name: str, table_name: str, request: EditTableRequest = Body(.
             if attr.data_type not in SUPPORTED_DATA_TYPES:
                 raise HTTPException(status_code=400, detail=f"Unsupported data type: {attr.data_type}")
             attr_list.append(Attribute(attr.name, attr.data_type))
-        table.schema = Schema(attr_list)
+        try:
+            table.schema = Schema(attr_list, primary_key=request.primary_key)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     # Handle table name change
     if request.new_table_name and request.new_table_name != table_name:
         if request.new_table_name in db.tables:
             raise HTTPException(status_code=400,
                                 detail=f"Table '{request.new_table_name}' already exists in database '{db_name}'.")
-        table.name = request.new_table_name
-        db.tables[request.new_table_name] = table
-        del db.tables[table_name]
+        db.rename_table(table_name, request.new_table_name)
+        store.log('rename_table', db=db_name, table=table_name, new_name=request.new_table_name)
 
     return {"message": f"Table '{table_name}' updated successfully."}
 
 
 @app.delete("/databases/{db_name}/tables/{table_name}", response_model=Dict)
+@durable_write
 def delete_table(db_name: str, table_name: str):
     """Delete a table from a database."""
     db = databases.get(db_name)
     if not db:
         raise HTTPException(status_code=404, detail=f"Database '{db_name}' not found.")
     if table_name in db.tables:
-        del db.tables[table_name]
+        db.drop_table(table_name)
+        store.log('delete_table', db=db_name, table=table_name)
         return {"message": f"Table '{table_name}' deleted successfully from database '{db_name}'."}
     raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found in database '{db_name}'.")
 
 
 # Row Endpoints
 
-@app.get("/databases/{db_name}/tables/{table_name}/rows", response_model=List[Dict])
-def list_rows(db_name: str, table_name: str):
-    """List all rows in a table."""
-    db = databases.get(db_name)
-    if not db:
-        raise HTTPException(status_code=404, detail=f"Database '{db_name}' not found.")
-    table = db.get_table(table_name)
-    if not table:
-        raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found in database '{db_name}'.")
-    return [row.data for row in table.rows]
+def encode_cursor(row_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after": row_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))["after"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def parse_filters(table: Table, filters: List[str]) -> list:
+    conditions = []
+    for text in filters:
+        try:
+            conditions.append(parse_predicate(text).condition(table.schema))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return conditions
+
+
+# Media types offered through the Accept header; the first one is the default
+ROW_MEDIA_TYPES = [JSON_MEDIA_TYPE, COLUMNAR_JSON_MEDIA_TYPE, COLUMNAR_BINARY_MEDIA_TYPE]
+EXPORT_MEDIA_TYPES = [XLSX_MEDIA_TYPE, COLUMNAR_JSON_MEDIA_TYPE, COLUMNAR_BINARY_MEDIA_TYPE]
+
+STREAM_FORMATS = {"json": "application/json", "ndjson": "application/x-ndjson"}
+STREAM_BATCH_SIZE = 1000  # Rows encoded per chunk sent to the client
+
+
+def stream_rows(snapshot, items, names, positions, with_ids: bool, stream_format: str):
+    """Encode (row id, values) pairs batch by batch as a JSON array or NDJSON."""
+    separator = b"\n" if stream_format == "ndjson" else b","
+    try:
+        if stream_format == "json":
+            yield b"["
+        first = True
+        for batch in chunked(items, STREAM_BATCH_SIZE):
+            encoded = []
+            for row_id, values in batch:
+                row = {"_id": row_id} if with_ids else {}
+                for name, position in zip(names, positions):
+                    row[name] = values[position]
+                encoded.append(encode_json(row))
+            chunk = separator.join(encoded)
+            if stream_format == "ndjson":
+                chunk += b"\n"
+            elif not first:
+                chunk = b"," + chunk
+            first = False
+            yield chunk
+        if stream_format == "json":
+            yield b"]"
+    finally:
+        snapshot.close()
+
+
+@app.get("/databases/{db_name}/tables/{table_name}/rows")
+def list_rows(db_name: str, table_name: str, response: Response,
+              with_ids: bool = Query(False, description="Add each row's stable id as '_id'"),
+              fields: Optional[str] = Query(None, description="Comma-separated attributes to return"),
+              filters: List[str] = Query([], alias="filter",
+                                         description="Typed predicate such as age>=30 or name=Ann; repeatable"),
+              limit: Optional[int] = Query(None, ge=1, description="Maximum number of rows"),
+              cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+              stream: Optional[str] = Query(None, description="'json' or 'ndjson': stream the rows incrementally"),
+              accept: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    """
+    List the rows of a table, optionally filtered, projected and paginated.
+
+    Filters on indexed attributes are answered from the index. When more rows
+    remain after `limit`, the X-Next-Cursor header holds the cursor of the next page.
+    With `stream`, rows are read from a snapshot and sent in batches as they are encoded.
+    Otherwise the Accept header may ask for the columnar JSON or binary layout.
+    Responses carry an ETag of the table version; If-None-Match answers 304 while it is unchanged.
+    """
+    table = find_table(db_name, table_name)
+    version = table.version  # Read before the rows, so the tag is never newer than the body
+    names = table.schema.names
+    if fields:
+        names = tuple(name.strip() for name in fields.split(","))
+        missing = [name for name in names if name not in table.schema.names]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Attribute(s) not found: {', '.join(missing)}")
+    positions = [table.schema.names.index(name) for name in names]
+    after_id = decode_cursor(cursor) if cursor else None
+    if stream is not None and stream not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown stream format: {stream}")
+    media_type = STREAM_FORMATS[stream] if stream else negotiate(accept, ROW_MEDIA_TYPES)
+    etag = make_etag(version, with_ids, names, filters, limit, after_id, media_type)
+    cached = not_modified(if_none_match, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+    if stream is not None:
+        conditions = parse_filters(table, filters)
+        snapshot = table.snapshot()
+        try:
+            matches = snapshot.find(conditions, after_id=after_id)
+        except ValueError as e:
+            snapshot.close()
+            raise HTTPException(status_code=400, detail=str(e))
+        return StreamingResponse(stream_rows(snapshot, islice(matches, limit), names, positions, with_ids, stream),
+                                 media_type=media_type, headers=dict(response.headers))
+    try:
+        matches = table.find(parse_filters(table, filters), after_id=after_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    page = list(islice(matches, limit + 1 if limit else None))
+    if limit and len(page) > limit:
+        page = page[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(page[-1][0])
+    if media_type != JSON_MEDIA_TYPE:
+        attributes = [table.schema.attributes[position] for position in positions]
+        body = encode_columnar(media_type, attributes,
+                               [tuple(values[position] for position in positions) for _, values in page],
+                               ids=[row_id for row_id, _ in page] if with_ids else None)
+        return Response(body, media_type=media_type, headers=dict(response.headers))
+    if not fields:
+        # Whole rows: the response body is concatenated from cached per-row JSON
+        return Response(row_cache.encode_rows(table, page, with_ids), media_type="application/json",
+                        headers=dict(response.headers))
+    rows = []
+    for row_id, values in page:
+        row = {"_id": row_id} if with_ids else {}
+        for name, position in zip(names, positions):
+            row[name] = values[position]
+        rows.append(row)
+    return rows
 
 
 @app.post("/databases/{db_name}/tables/{table_name}/rows", status_code=201)
+@durable_write
 def insert_row(db_name: str, table_name: str, row: RowModel):
     """Insert a new row into a table."""
     db = databases.get(db_name)
@@ -234,18 +513,71 @@ def insert_row(db_name: str, table_name: str, row: RowModel):
     if not table:
         raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found in database '{db_name}'.")
 
-    parsed_data = {}
-    for attr in table.schema.attributes:
-        value = row.data.get(attr.name)
+    try:
+        values = table.schema.parse_row(row.data)
+    except SchemaValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid input for '{e.attribute}': {e.reason}")
+
+    try:
+        row_id = table.insert_values(values)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Row inserted successfully.", "id": row_id}
+
+
+def insert_bulk_body(table: Table, body: bytes, ndjson: bool) -> int:
+    """Parse a bulk insert body (JSON array or NDJSON) and insert its rows, all-or-nothing."""
+    rows = []
+    errors = []
+    if ndjson:
+        for position, line in enumerate(line for line in body.splitlines() if line.strip()):
+            try:
+                rows.append(json.loads(line))
+            except ValueError as e:
+                rows.append(None)
+                errors.append({"row": position, "error": f"Invalid JSON: {e}"})
+    else:
         try:
-            parsed_value = parse_data(value, attr.data_type)
-            parsed_data[attr.name] = parsed_value
+            rows = json.loads(body)
         except ValueError as e:
-            raise HTTPException(status_code=400, detail=f"Invalid input for '{attr.name}': {str(e)}")
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of rows.")
+    for position, data in enumerate(rows):
+        if data is not None and not isinstance(data, dict):
+            errors.append({"row": position, "error": "Row must be a JSON object."})
+    if errors:
+        errors.sort(key=lambda error: error["row"])
+        raise HTTPException(status_code=400, detail={"errors": errors})
+
+    try:
+        with store.transaction():
+            return table.insert_many(rows)
+    except BulkInsertError as e:
+        raise HTTPException(status_code=400,
+                            detail={"errors": [{"row": position, "error": message} for position, message in e.errors]})
+
+
+@app.post("/databases/{db_name}/tables/{table_name}/rows:bulk", status_code=201)
+async def insert_rows_bulk(db_name: str, table_name: str, request: Request):
+    """
+    Insert many rows at once, all-or-nothing.
+
+    The body is either a JSON array of objects or NDJSON (one object per line,
+    Content-Type: application/x-ndjson); each object maps attribute names to values.
+    """
+    db = databases.get(db_name)
+    if not db:
+        raise HTTPException(status_code=404, detail=f"Database '{db_name}' not found.")
+    table = db.get_table(table_name)
+    if not table:
+        raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found in database '{db_name}'.")
 
-    new_row = Row(parsed_data)
-    table.insert_row(new_row)
-    return {"message": "Row inserted successfully."}
+    body = await request.body()
+    # Parsing and inserting are CPU-bound: both run in the thread pool, off the event loop
+    ndjson = "ndjson" in request.headers.get("content-type", "")
+    inserted = await run_in_threadpool(insert_bulk_body, table, body, ndjson)
+    return {"message": f"{inserted} rows inserted successfully.", "inserted": inserted}
 
 
 @app.get("/databases/{db_name}/tables/{table_name}/rows/{row_index}", response_model=Dict)
@@ -259,12 +591,13 @@ def get_row(db_name: str, table_name: str, row_index: int = Path(..., ge=0)):
         raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found in database '{db_name}'.")
     try:
         row = table.rows[row_index]
-        return row.data
     except IndexError:
         raise HTTPException(status_code=404, detail="Row not found.")
+    return Response(row_cache.encode_row(table, row.row_id), media_type="application/json")
 
 
 @app.put("/databases/{db_name}/tables/{table_name}/rows/{row_index}", response_model=Dict)
+@durable_write
 def update_row(db_name: str, table_name: str, row_index: int, row: RowModel):
     """Update a specific row by index."""
     db = databases.get(db_name)
@@ -276,21 +609,21 @@ def update_row(db_name: str, table_name: str, row_index: int, row: RowModel):
     if row_index >= len(table.rows) or row_index < 0:
         raise HTTPException(status_code=404, detail="Row not found.")
 
-    parsed_data = {}
-    for attr in table.schema.attributes:
-        value = row.data.get(attr.name)
-        try:
-            parsed_value = parse_data(value, attr.data_type)
-            parsed_data[attr.name] = parsed_value
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=f"Invalid input for '{attr.name}': {str(e)}")
+    try:
+        values = table.schema.parse_row(row.data)
+    except SchemaValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid input for '{e.attribute}': {e.reason}")
 
-    updated_row = Row(parsed_data)
-    table.update_row(row_index, updated_row)
+    updated_row = Row.from_values(table.schema.names, values)
+    try:
+        table.update_row(row_index, updated_row, trusted=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"message": "Row updated successfully."}
 
 
 @app.delete("/databases/{db_name}/tables/{table_name}/rows/{row_index}", response_model=Dict)
+@durable_write
 def delete_row(db_name: str, table_name: str, row_index: int):
     """Delete a specific row by index."""
     db = databases.get(db_name)
@@ -306,34 +639,206 @@ def delete_row(db_name: str, table_name: str, row_index: int):
         raise HTTPException(status_code=404, detail="Row not found.")
 
 
-# Export Table Endpoint
+# Row Endpoints by stable id / primary key
 
-@app.get("/databases/{db_name}/tables/{table_name}/export", response_class=FileResponse)
-def export_table(db_name: str, table_name: str):
-    """Export table data to an Excel file."""
+def parse_row_or_400(table: Table, row: RowModel) -> Row:
+    try:
+        values = table.schema.parse_row(row.data)
+    except SchemaValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid input for '{e.attribute}': {e.reason}")
+    return Row.from_values(table.schema.names, values)
+
+
+def id_for_key_or_404(table: Table, key: str) -> int:
+    if table.schema.primary_key is None:
+        raise HTTPException(status_code=400, detail=f"Table '{table.name}' has no primary key.")
+    key_attr = table.schema.attributes[table.schema.key_position]
+    try:
+        return table.id_for_key(get_parser(key_attr.data_type)(key))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid key: {e}")
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Row not found.")
+
+
+@app.get("/databases/{db_name}/tables/{table_name}/rows/by-id/{row_id}", response_model=Dict)
+def get_row_by_id(db_name: str, table_name: str, row_id: int):
+    """Get a row by its stable id."""
+    table = find_table(db_name, table_name)
+    try:
+        return Response(row_cache.encode_row(table, row_id, with_id=True), media_type="application/json")
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Row not found.")
+
+
+@app.put("/databases/{db_name}/tables/{table_name}/rows/by-id/{row_id}", response_model=Dict)
+@durable_write
+def update_row_by_id(db_name: str, table_name: str, row_id: int, row: RowModel):
+    """Update a row by its stable id."""
+    table = find_table(db_name, table_name)
+    updated_row = parse_row_or_400(table, row)
+    try:
+        table.update_row_by_id(row_id, updated_row, trusted=True)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Row not found.")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Row updated successfully."}
+
+
+@app.delete("/databases/{db_name}/tables/{table_name}/rows/by-id/{row_id}", response_model=Dict)
+@durable_write
+def delete_row_by_id(db_name: str, table_name: str, row_id: int):
+    """Delete a row by its stable id."""
+    table = find_table(db_name, table_name)
+    try:
+        table.delete_row_by_id(row_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Row not found.")
+    return {"message": "Row deleted successfully."}
+
+
+@app.get("/databases/{db_name}/tables/{table_name}/rows/by-key/{key}", response_model=Dict)
+def get_row_by_key(db_name: str, table_name: str, key: str):
+    """Get a row by its primary key value."""
+    table = find_table(db_name, table_name)
+    return Response(row_cache.encode_row(table, id_for_key_or_404(table, key), with_id=True),
+                    media_type="application/json")
+
+
+@app.put("/databases/{db_name}/tables/{table_name}/rows/by-key/{key}", response_model=Dict)
+@durable_write
+def update_row_by_key(db_name: str, table_name: str, key: str, row: RowModel):
+    """Update a row by its primary key value."""
+    table = find_table(db_name, table_name)
+    row_id = id_for_key_or_404(table, key)
+    updated_row = parse_row_or_400(table, row)
+    try:
+        table.update_row_by_id(row_id, updated_row, trusted=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": "Row updated successfully."}
+
+
+@app.delete("/databases/{db_name}/tables/{table_name}/rows/by-key/{key}", response_model=Dict)
+@durable_write
+def delete_row_by_key(db_name: str, table_name: str, key: str):
+    """Delete a row by its primary key value."""
+    table = find_table(db_name, table_name)
+    table.delete_row_by_id(id_for_key_or_404(table, key))
+    return {"message": "Row deleted successfully."}
+
+
+@app.post("/databases/{db_name}/tables/{table_name}/delete_duplicate_rows", response_model=Dict)
+@durable_write
+def delete_duplicate_rows(db_name: str, table_name: str, request: Optional[DeduplicateRequest] = None):
+    """Remove repeated rows, optionally comparing only a subset of attributes."""
+    request = request or DeduplicateRequest()
     db = databases.get(db_name)
     if not db:
         raise HTTPException(status_code=404, detail=f"Database '{db_name}' not found.")
     table = db.get_table(table_name)
     if not table:
         raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found in database '{db_name}'.")
+    try:
+        removed = table.deduplicate(request.subset, keep=request.keep)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": f"{removed} duplicate rows deleted.", "removed": removed}
+
+
+# Index Endpoints
+
+@app.get("/databases/{db_name}/tables/{table_name}/indexes", response_model=Dict[str, str])
+def list_indexes(db_name: str, table_name: str):
+    """List the secondary indexes of a table (attribute -> index kind)."""
+    return find_table(db_name, table_name).indexes
+
+
+@app.post("/databases/{db_name}/tables/{table_name}/indexes", status_code=201)
+@durable_write
+def create_index(db_name: str, table_name: str, index: IndexModel):
+    """Create a hash or sorted index on one attribute."""
+    table = find_table(db_name, table_name)
+    try:
+        table.create_index(index.attribute, index.kind)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"message": f"{index.kind.capitalize()} index on '{index.attribute}' created successfully."}
+
 
-    # Convert table data to DataFrame
-    data = [row.data for row in table.rows]
-    df = pd.DataFrame(data)
+@app.delete("/databases/{db_name}/tables/{table_name}/indexes/{attribute}", response_model=Dict)
+@durable_write
+def drop_index(db_name: str, table_name: str, attribute: str):
+    """Drop the index on an attribute."""
+    table = find_table(db_name, table_name)
+    try:
+        table.drop_index(attribute)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    return {"message": f"Index on '{attribute}' dropped successfully."}
+
+
+@app.get("/databases/{db_name}/tables/{table_name}/indexes/{attribute}/rows", response_model=List[Dict])
+def search_index(db_name: str, table_name: str, attribute: str, value: str,
+                 op: str = Query("=", description="One of =, <, <=, >, >= (ranges need a sorted index)")):
+    """Rows whose attribute matches `op value`, found through the attribute's index."""
+    table = find_table(db_name, table_name)
+    if attribute not in table.indexes:
+        raise HTTPException(status_code=404, detail=f"No index on attribute '{attribute}'.")
+    attr = table.schema.attributes[table.schema.names.index(attribute)]
+    try:
+        row_ids = table.search_ids(attribute, op, get_parser(attr.data_type)(value))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid search: {e}")
+    return [{"_id": row_id, **table.get_row_by_id(row_id).data} for row_id in row_ids]
+
+
+# Export Table Endpoint
+
+@app.get("/databases/{db_name}/tables/{table_name}/export", response_class=StreamingResponse)
+def export_table(db_name: str, table_name: str, accept: Optional[str] = Header(None),
+                 if_none_match: Optional[str] = Header(None)):
+    """Export table data to an Excel file, or to a columnar format requested through Accept.
 
-    # Save DataFrame to Excel file
-    exports_dir = "exports"
-    os.makedirs(exports_dir, exist_ok=True)
-    file_path = os.path.join(exports_dir, f"{db_name}_{table_name}.xlsx")
-    df.to_excel(file_path, index=False)
+    The body only changes with the table version: If-None-Match answers 304,
+    and recent exports are served from export_cache.
+    """
+    db = databases.get(db_name)
+    if not db:
+        raise HTTPException(status_code=404, detail=f"Database '{db_name}' not found.")
+    table = db.get_table(table_name)
+    if not table:
+        raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found in database '{db_name}'.")
 
-    # Return the file as a response
-    return FileResponse(
-        path=file_path,
-        filename=f"{table_name}.xlsx",
-        media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
+    media_type = negotiate(accept, EXPORT_MEDIA_TYPES)
+    etag = make_etag(table.version, table_name, media_type)  # Read before the rows
+    cached = not_modified(if_none_match, etag)
+    if cached:
+        return cached
+    headers = {"ETag": etag}
+    if media_type == XLSX_MEDIA_TYPE:
+        headers.update(attachment_headers(f"{table_name}.xlsx"))
+    body = export_cache.get(etag)
+    if body is not None:
+        return Response(body, media_type=media_type, headers=headers)
+
+    if media_type != XLSX_MEDIA_TYPE:
+        body = encode_columnar(media_type, table.schema.attributes, list(table.iter_values()),
+                               ids=list(table.row_ids()))
+    else:
+        # Rows are read from a snapshot, so writers are not held up while the workbook is built
+        with table.snapshot() as snapshot:
+            spool = spooled_xlsx(table.schema.names, (values for _, values in snapshot.find()), title=table_name)
+        if spool.seek(0, os.SEEK_END) > EXPORT_CACHE_MAX_ENTRY:
+            spool.seek(0)
+            return StreamingResponse(iter_file(spool), media_type=media_type, headers=headers)
+        spool.seek(0)
+        with spool:
+            body = spool.read()
+    if len(body) <= EXPORT_CACHE_MAX_ENTRY:
+        export_cache.put(etag, body)
+    return Response(body, media_type=media_type, headers=headers)
 
 
 # Product Tables Endpoint
@@ -368,14 +873,122 @@ def product_tables(request: ProductTablesRequest):
             detail=f"Table '{request.new_table_name}' already exists in database '{request.destination_db_name}'."
         )
 
-    # Perform table product operation
-    new_table = table_product(table1, table2, request.new_table_name)
-    destination_db.create_table(new_table)
+    if request.engine not in PRODUCT_ENGINES:
+        raise HTTPException(status_code=400, detail=f"Unknown product engine: {request.engine}")
+
+    # Perform table product operation; only storing the result takes the write lock
+    try:
+        new_table = table_product(table1, table2, request.new_table_name, engine=request.engine,
+                                  workers=request.workers or 1, chunk_size=request.chunk_size or DEFAULT_CHUNK_SIZE)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    store_new_table(request.destination_db_name, new_table)
 
     return {
         "message": f"Product table '{request.new_table_name}' created successfully in database '{request.destination_db_name}'."}
 
 
+# Join Tables Endpoint
+
+@app.post("/join_tables", response_model=Dict)
+def join_tables(request: JoinTablesRequest):
+    """
+    Hash-join two tables on equal attribute values and store the result in a destination database.
+    """
+    table1 = get_table_by_fullname(request.table1_fullname)
+    table2 = get_table_by_fullname(request.table2_fullname)
+    destination_db = databases.get(request.destination_db_name)
+    if not destination_db:
+        raise HTTPException(status_code=404, detail=f"Database '{request.destination_db_name}' not found.")
+    if request.new_table_name in destination_db.tables:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Table '{request.new_table_name}' already exists in database '{request.destination_db_name}'."
+        )
+    if request.how not in JOIN_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown join type: {request.how}")
+
+    try:
+        new_table = hash_join(table1, table2, [(cond.left, cond.right) for cond in request.on],
+                              request.new_table_name, how=request.how)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    store_new_table(request.destination_db_name, new_table)
+
+    return {
+        "message": f"Joined table '{request.new_table_name}' created successfully in database '{request.destination_db_name}'.",
+        "rows_count": new_table.row_count()}
+
+
+# Query Endpoint
+
+@app.post("/query")
+def run_query(request: QueryRequest):
+    """
+    Evaluate a relational operator tree (scan, select, project, union, difference, intersection).
+
+    Operators are pipelined, so only the final result is materialized: either
+    returned as rows (up to `limit`) or stored as a new table.
+    """
+    try:
+        plan = build_plan(request.plan, get_table_by_fullname)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if request.destination_db_name is None:
+        return {"attributes": list(plan.schema.names), "rows": [row.data.copy() for row in fetch(plan, request.limit)]}
+
+    destination_db = databases.get(request.destination_db_name)
+    if not destination_db:
+        raise HTTPException(status_code=404, detail=f"Database '{request.destination_db_name}' not found.")
+    if not request.new_table_name:
+        raise HTTPException(status_code=400, detail="new_table_name is required when storing the result.")
+    if request.new_table_name in destination_db.tables:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Table '{request.new_table_name}' already exists in database '{request.destination_db_name}'."
+        )
+    new_table = materialize(plan, request.new_table_name)
+    store_new_table(request.destination_db_name, new_table)
+    return {"message": f"Query result stored as '{request.new_table_name}' in database '{request.destination_db_name}'.",
+            "rows_count": new_table.row_count()}
+
+
+def lazy_product(table1_fullname: str, table2_fullname: str) -> ProductTable:
+    try:
+        return ProductTable(get_table_by_fullname(table1_fullname), get_table_by_fullname(table2_fullname),
+                            f"{table1_fullname}_x_{table2_fullname}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/product_tables/rows", response_model=List[Dict])
+def list_product_rows(table1_fullname: str, table2_fullname: str,
+                      offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=10000),
+                      accept: Optional[str] = Header(None)):
+    """
+    List a page of the product of two tables without storing it.
+    """
+    product = lazy_product(table1_fullname, table2_fullname)
+    rows = list(islice(product.iter_values(offset), limit))
+    media_type = negotiate(accept, ROW_MEDIA_TYPES)
+    if media_type != JSON_MEDIA_TYPE:
+        return Response(encode_columnar(media_type, product.schema.attributes, rows), media_type=media_type)
+    names = product.schema.names
+    return [dict(zip(names, values)) for values in rows]
+
+
+@app.get("/product_tables/export", response_class=StreamingResponse)
+def export_product_table(table1_fullname: str, table2_fullname: str):
+    """
+    Export the product of two tables to Excel, streaming rows from the lazy product.
+    """
+    product = lazy_product(table1_fullname, table2_fullname)
+    spool = spooled_xlsx(product.schema.names, product.iter_values(), title="product")
+    return StreamingResponse(iter_file(spool), media_type=XLSX_MEDIA_TYPE,
+                             headers=attachment_headers(f"product_{table1_fullname}_{table2_fullname}.xlsx"))
+
+
 # Additional Endpoints (Optional)
 
 @app.get("/tables", response_model=List[str])
@@ -384,17 +997,21 @@ def list_all_tables():
     return get_all_tables()
 
 
-@app.get("/tables/export_all", response_model=Dict)
-def export_all_tables():
-    """Export all tables to Excel files."""
-    exported_files = []
-    for db_name, db in databases.items():
-        for table_name, table in db.tables.items():
-            data = [row.data for row in table.rows]
-            df = pd.DataFrame(data)
-            exports_dir = "exports"
-            os.makedirs(exports_dir, exist_ok=True)
-            file_path = os.path.join(exports_dir, f"{db_name}_{table_name}.xlsx")
-            df.to_excel(file_path, index=False)
-            exported_files.append(file_path)
-    return {"exported_files": exported_files}
+@app.get("/tables/export_all", response_class=StreamingResponse)
+def export_all_tables(workers: Optional[int] = Query(None, ge=1, le=EXPORT_WORKERS,
+                                                     description="Worker processes for this export")):
+    """
+    Export every table to Excel as one ZIP archive with an entry per table ("db/table.xlsx").
+
+    Workbooks are built in parallel worker processes and each is streamed as soon as it is done.
+    """
+    def jobs():
+        for db_name, db in list(databases.items()):
+            for table_name, table in list(db.tables.items()):
+                with store.lock:  # Copy the live rows out between two writes
+                    names = table.schema.names
+                    columns = [column.copy() for column in table.columns]
+                yield f"{db_name}/{table_name}.xlsx", names, table_name, columns
+
+    return StreamingResponse(zip_workbooks(jobs(), workers or EXPORT_WORKERS), media_type="application/zip",
+                             headers=attachment_headers("tables.zip"))
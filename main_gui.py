@@ -9,6 +9,9 @@ from schema import Schema
 from attributes import Attribute
 from row import Row
 from operations import table_product
+from table_view import VirtualTableView
+from tasks import TaskRunner
+from excel_export import write_xlsx
 
 # Initialize databases dictionary
 databases = {}  # Key: Database name, Value: Database instance
@@ -17,6 +20,7 @@ class DatabaseApp:
     def __init__(self, root):
         self.root = root
         self.root.title("SQL-like Database Application")
+        self.tasks = TaskRunner(root)  # Exports and products run in the background
 
         self.create_main_menu()
 
@@ -159,16 +163,14 @@ class DatabaseApp:
             schema = Schema(attr_list)
             table.schema = schema
             if new_table_name != table_name:
-                del db.tables[table_name]
-                table.name = new_table_name
-                db.tables[new_table_name] = table
+                db.rename_table(table_name, new_table_name)
             self.open_database(db.name)
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
     def delete_table(self, db, table_name):
         if messagebox.askyesno("Delete Table", f"Are you sure you want to delete table '{table_name}'?"):
-            del db.tables[table_name]
+            db.drop_table(table_name)
             self.open_database(db.name)
 
     def open_table(self, db, table_name):
@@ -185,28 +187,47 @@ class DatabaseApp:
         ttk.Button(button_frame, text="Back", command=lambda: self.open_database(db.name)).pack(side=tk.LEFT, padx=5)
 
         if table.rows:
-            columns = [attr.name for attr in table.schema.attributes]
-            tree = ttk.Treeview(self.main_frame, columns=columns, show='headings')
-            for col in columns:
-                tree.heading(col, text=col)
-
-            for idx, row in enumerate(table.rows):
-                values = [row.data.get(attr.name, '') for attr in table.schema.attributes]
-                tree.insert('', tk.END, iid=idx, values=values)
-
-            tree.pack(padx=20, pady=10, fill=tk.BOTH, expand=True)
+            # Filter and sort run on the table data; the view only renders the rows scrolled into view
+            filter_frame = ttk.Frame(self.main_frame)
+            filter_frame.pack(fill=tk.X, padx=20)
+            ttk.Label(filter_frame, text="Filter (e.g. age>=30; name=Ann):").pack(side=tk.LEFT)
+            filter_entry = ttk.Entry(filter_frame)
+            filter_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+            count_label = ttk.Label(filter_frame)
+
+            def update_count():
+                count_label.config(text=f"{view.row_count()} of {table.row_count()} rows")
+
+            # Row edits reach the view as table change events and only touch the affected item
+            view = VirtualTableView(self.main_frame, table, on_change=update_count)
+
+            def apply_filter(text):
+                try:
+                    view.set_filter(text)
+                except ValueError as e:
+                    messagebox.showerror("Error", str(e))
+                update_count()
+
+            ttk.Button(filter_frame, text="Apply", command=lambda: apply_filter(filter_entry.get())).pack(side=tk.LEFT)
+            ttk.Button(filter_frame, text="Clear",
+                       command=lambda: (filter_entry.delete(0, tk.END), apply_filter(''))).pack(side=tk.LEFT, padx=5)
+            count_label.pack(side=tk.LEFT, padx=5)
+            update_count()
+            filter_entry.bind("<Return>", lambda event: apply_filter(filter_entry.get()))
+
+            view.pack(padx=20, pady=10, fill=tk.BOTH, expand=True)
 
             # Add right-click menu
-            tree.bind("<Button-3>", lambda event: self.show_row_menu(event, db, table, tree))
+            view.tree.bind("<Button-3>", lambda event: self.show_row_menu(event, db, table, view))
         else:
             ttk.Label(self.main_frame, text="No rows in this table.", font=("Helvetica", 12)).pack(pady=10)
 
-    def show_row_menu(self, event, db, table, tree):
-        selected_item = tree.identify_row(event.y)
-        if selected_item:
+    def show_row_menu(self, event, db, table, view):
+        row_id = view.row_id_at(event.y)  # Tree items are identified by stable row ids
+        if row_id is not None:
             menu = tk.Menu(self.root, tearoff=0)
-            menu.add_command(label="Edit", command=lambda: self.edit_row(db, table, int(selected_item)))
-            menu.add_command(label="Delete", command=lambda: self.delete_row(db, table, int(selected_item)))
+            menu.add_command(label="Edit", command=lambda: self.edit_row(db, table, row_id))
+            menu.add_command(label="Delete", command=lambda: self.delete_row(db, table, row_id))
             menu.post(event.x_root, event.y_root)
 
     def insert_row(self, db, table):
@@ -222,11 +243,13 @@ class DatabaseApp:
                 messagebox.showerror("Error", str(e))
                 return
         row = Row(row_data)
-        table.insert_row(row)
-        self.open_table(db, table.name)
+        was_empty = table.row_count() == 0
+        table.insert_row(row, trusted=True)
+        if was_empty:
+            self.open_table(db, table.name)  # Replace the "No rows" label with a view
 
-    def edit_row(self, db, table, row_index):
-        row = table.rows[row_index]
+    def edit_row(self, db, table, row_id):
+        row = table.get_row_by_id(row_id)
         row_data = row.data.copy()
         for attr in table.schema.attributes:
             value = simpledialog.askstring("Edit Row", f"Enter new value for {attr.name} ({attr.data_type}):", initialvalue=str(row_data.get(attr.name, '')))
@@ -239,31 +262,33 @@ class DatabaseApp:
                 messagebox.showerror("Error", str(e))
                 return
         updated_row = Row(row_data)
-        table.update_row(row_index, updated_row)
-        self.open_table(db, table.name)
+        table.update_row_by_id(row_id, updated_row, trusted=True)
 
-    def delete_row(self, db, table, row_index):
+    def delete_row(self, db, table, row_id):
         if messagebox.askyesno("Delete Row", "Are you sure you want to delete this row?"):
-            table.delete_row(row_index)
-            self.open_table(db, table.name)
+            table.delete_row_by_id(row_id)
 
     def export_table_to_excel(self, db, table):
-        import pandas as pd
-        import os
         from tkinter.filedialog import asksaveasfilename
 
-        # Convert table data to DataFrame
-        data = [row.data for row in table.rows]
-        df = pd.DataFrame(data)
-
         # Prompt user for save location
         file_path = asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")])
-        if file_path:
-            try:
-                df.to_excel(file_path, index=False)
-                messagebox.showinfo("Success", f"Table exported to {file_path}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to export table: {e}")
+        if not file_path:
+            return
+
+        names = list(table.schema.names)
+        total = table.row_count()
+        snapshot = table.snapshot()  # The worker reads the rows as they are now
+
+        def export(task):
+            # Rows stream from the snapshot into the workbook; no copy of the table is built
+            with snapshot:
+                write_xlsx(names, (values for _, values in snapshot.find()), file_path, title=table.name,
+                           progress=lambda written: task.report(written, total))
+
+        self.tasks.run("Exporting table", export,
+                       on_done=lambda result: messagebox.showinfo("Success", f"Table exported to {file_path}"),
+                       on_error=lambda e: messagebox.showerror("Error", f"Failed to export table: {e}"))
     def product_of_tables(self):
         if not databases:
             messagebox.showerror("Error", "No databases available.")
@@ -311,12 +336,18 @@ class DatabaseApp:
         table2 = db2.get_table(table2_name)
 
         full_table_name = f"{destination_db_name}_{new_table_name}"
-        try:
-            new_table = table_product(table1, table2, full_table_name)
-            destination_db.create_table(new_table)
-            messagebox.showinfo("Success", f"Product table '{new_table_name}' created in database '{destination_db_name}'.")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+
+        def created(new_table):
+            # Runs on the Tk thread, so the new table's listeners do too
+            try:
+                destination_db.create_table(new_table)
+                messagebox.showinfo("Success", f"Product table '{new_table_name}' created in database '{destination_db_name}'.")
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+
+        self.tasks.run("Computing product",
+                       lambda task: table_product(table1, table2, full_table_name, progress=task.report),
+                       on_done=created)
 
 # Run the application
 if __name__ == "__main__":
@@ -1,19 +1,281 @@
 # operations.py
+from collections import deque
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import multiprocessing
+
+from attributes import Attribute
 from row import Row
 from schema import Schema
+from storage import ObjectColumn
 from table import Table
 
+DEFAULT_CHUNK_SIZE = 10000
+
+# Process pools never fork the caller: a forked child of a threaded server would
+# inherit its locks in whatever state other threads held them
+POOL_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+
+def combine_attributes(table1: Table, table2: Table, nullable_right: bool = False) -> list:
+    """Attributes of table1 followed by table2; names present in both are qualified as table.attr."""
+    left_prefix = table1.name
+    right_prefix = table2.name if table2.name != table1.name else f"{table2.name}_2"
+    shared = set(table1.schema.names) & set(table2.schema.names)
+    attributes = []
+    for prefix, table, nullable in ((left_prefix, table1, False), (right_prefix, table2, nullable_right)):
+        for attr in table.schema.attributes:
+            name = f"{prefix}.{attr.name}" if attr.name in shared else attr.name
+            attributes.append(Attribute(name, attr.data_type, attr.nullable or nullable))
+    names = [attr.name for attr in attributes]
+    if len(set(names)) != len(names):
+        raise ValueError("Cannot build unique attribute names for the combined table.")
+    return attributes
+
+
+class ProductRowsView(Sequence):
+    """Read-only rows of a ProductTable; row i pairs left row i // m with right row i % m."""
+
+    def __init__(self, product: 'ProductTable'):
+        self._product = product
+
+    def __len__(self):
+        return self._product.row_count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("Row index out of range.")
+        return Row.from_values(self._product.schema.names, self._product.get_values(index))
+
+    def __iter__(self):
+        names = self._product.schema.names
+        for values in self._product.iter_values():
+            yield Row.from_values(names, values)
+
+
+class ProductTable:
+    """Virtual, read-only Cartesian product of two tables.
+
+    Nothing is materialized: rows are combined on demand, so memory does not
+    grow with |table1| x |table2|.
+    """
+
+    def __init__(self, table1: Table, table2: Table, name: str):
+        self.name = name
+        self.table1 = table1
+        self.table2 = table2
+        self.schema = Schema(combine_attributes(table1, table2))
+
+    @property
+    def rows(self) -> ProductRowsView:
+        return ProductRowsView(self)
+
+    def row_count(self) -> int:
+        return self.table1.row_count() * self.table2.row_count()
+
+    def get_values(self, index: int) -> tuple:
+        left, right = divmod(index, self.table2.row_count())
+        return self.table1.get_values(left) + self.table2.get_values(right)
+
+    def iter_values(self, start: int = 0):
+        """Yield combined value tuples, optionally skipping the first `start` rows."""
+        right_count = self.table2.row_count()
+        if not right_count:
+            return
+        first_left, first_right = divmod(start, right_count)
+        for left in range(first_left, self.table1.row_count()):
+            values1 = self.table1.get_values(left)
+            right_values = self.table2.iter_values()
+            if left == first_left and first_right:
+                right_values = islice(right_values, first_right, None)
+            for values2 in right_values:
+                yield values1 + values2
+
+
+def chunked(values, chunk_size: int):
+    iterator = iter(values)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def vectorized_product(table1: Table, table2: Table, new_table_name: str) -> Table:
+    """Build the product column-wise: left columns repeated, right columns tiled."""
+    schema = Schema(combine_attributes(table1, table2))
+    left_count, right_count = table1.row_count(), table2.row_count()
+    columns = ([column.repeat(right_count) for column in table1.columns] +
+               [column.tile(left_count) for column in table2.columns])
+    return Table.from_columns(new_table_name, schema, columns)
+
+
+_worker_right_columns = None
+
+
+def _init_product_worker(right_columns):
+    global _worker_right_columns
+    _worker_right_columns = right_columns
+
+
+def _product_chunk(left_columns):
+    left_count = len(left_columns[0]) if left_columns else 0
+    right_count = len(_worker_right_columns[0]) if _worker_right_columns else 0
+    return ([column.repeat(right_count) for column in left_columns] +
+            [column.tile(left_count) for column in _worker_right_columns])
+
+
+def parallel_product(table1: Table, table2: Table, new_table_name: str,
+                     workers: int, chunk_size: int = DEFAULT_CHUNK_SIZE, progress=None) -> Table:
+    """Compute the product in a process pool, one slice of the left table per task.
+
+    Each task yields about `chunk_size` result rows; results are appended to
+    the destination in left-table order, with at most 2 * workers tasks in flight.
+    """
+    schema = Schema(combine_attributes(table1, table2))
+    new_table = Table(name=new_table_name, schema=schema)
+    left_count, right_count = table1.row_count(), table2.row_count()
+    if not left_count or not right_count:
+        return new_table
+    step = max(1, chunk_size // right_count)
+
+    source_columns = table1.columns
+
+    def left_slices():
+        for start in range(0, left_count, step):
+            indices = range(start, min(start + step, left_count))
+            yield [column.take(indices) for column in source_columns]
+
+    total = left_count * right_count
+
+    def collect(future):
+        new_table.extend_columns(future.result())
+        if progress is not None:
+            progress(new_table.row_count(), total)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT, initializer=_init_product_worker,
+                             initargs=(table2.columns,)) as executor:
+        pending = deque()
+        try:
+            for left_columns in left_slices():
+                pending.append(executor.submit(_product_chunk, left_columns))
+                if len(pending) >= 2 * workers:
+                    collect(pending.popleft())
+            while pending:
+                collect(pending.popleft())
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+    return new_table
+
+
+PRODUCT_ENGINES = {'python', 'vectorized'}
+
 
 # operations.py
-def table_product(table1: Table, table2: Table, new_table_name: str) -> Table:
-    new_attributes = table1.schema.attributes + table2.schema.attributes
-    new_schema = Schema(new_attributes)
-    new_table = Table(name=new_table_name, schema=new_schema)
+def table_product(table1: Table, table2: Table, new_table_name: str,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE, engine: str = 'python', workers: int = 1,
+                  progress=None) -> Table:
+    """Materialize table1 x table2.
 
-    for row1 in table1.rows:
-        for row2 in table2.rows:
-            combined_data = {**row1.data, **row2.data}
-            new_row = Row(combined_data)
-            new_table.insert_row(new_row)
+    `progress(done, total)` is called as result rows are produced (once at the
+    end for the vectorized engine); an exception raised by it stops the product.
+    """
+    if engine not in PRODUCT_ENGINES:
+        raise ValueError(f"Unknown product engine: {engine}")
+    if workers > 1:
+        return parallel_product(table1, table2, new_table_name, workers, chunk_size, progress)
+    if engine == 'vectorized':
+        new_table = vectorized_product(table1, table2, new_table_name)
+        if progress is not None:
+            progress(new_table.row_count(), new_table.row_count())
+        return new_table
+
+    product = ProductTable(table1, table2, new_table_name)
+    new_table = Table(name=new_table_name, schema=product.schema)
+    total = product.row_count()
+
+    # Source values are already typed, so chunks go through the trusted path
+    for chunk in chunked(product.iter_values(), chunk_size):
+        new_table.append_values(chunk)
+        if progress is not None:
+            progress(new_table.row_count(), total)
 
     return new_table
+
+
+JOIN_TYPES = {'inner', 'left'}
+
+
+def _key_columns(table: Table, names: list):
+    try:
+        return [table.column(name) for name in names]
+    except KeyError as e:
+        raise ValueError(e.args[0]) from None
+
+
+def _keys(columns: list):
+    if len(columns) == 1:
+        return columns[0].values()
+    return zip(*[column.values() for column in columns])
+
+
+def _is_null_key(key) -> bool:
+    # As in SQL, None never matches anything, including another None
+    return key is None or (isinstance(key, tuple) and None in key)
+
+
+def hash_join(table1: Table, table2: Table, on: list, new_table_name: str, how: str = 'inner') -> Table:
+    """Equi-join two tables on one or more (table1 attribute, table2 attribute) pairs.
+
+    An inner join builds the hash table on the smaller input and probes it
+    with the other. A left join always builds on table2 so every table1 row
+    is emitted; unmatched rows get None in table2's (nullable) attributes.
+    Runs in O(n + m + output).
+    """
+    if how not in JOIN_TYPES:
+        raise ValueError(f"Unknown join type: {how}")
+    if not on:
+        raise ValueError("At least one pair of join attributes is required.")
+    left_keys = _key_columns(table1, [left for left, _ in on])
+    right_keys = _key_columns(table2, [right for _, right in on])
+
+    build_left = how == 'inner' and table1.row_count() < table2.row_count()
+    build_keys, probe_keys = (left_keys, right_keys) if build_left else (right_keys, left_keys)
+
+    buckets = {}
+    for index, key in enumerate(_keys(build_keys)):
+        if not _is_null_key(key):
+            buckets.setdefault(key, []).append(index)
+
+    left_indices, right_indices = [], []
+    for index, key in enumerate(_keys(probe_keys)):
+        matches = None if _is_null_key(key) else buckets.get(key)
+        if matches is None:
+            if how == 'left':
+                left_indices.append(index)
+                right_indices.append(None)
+            continue
+        for match in matches:
+            if build_left:
+                left_indices.append(match)
+                right_indices.append(index)
+            else:
+                left_indices.append(index)
+                right_indices.append(match)
+
+    schema = Schema(combine_attributes(table1, table2, nullable_right=how == 'left'))
+    columns = [column.take(left_indices) for column in table1.columns]
+    if how == 'left':
+        columns += [ObjectColumn([None if i is None else column.get(i) for i in right_indices])
+                    for column in table2.columns]
+    else:
+        columns += [column.take(right_indices) for column in table2.columns]
+    return Table.from_columns(new_table_name, schema, columns)
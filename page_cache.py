@@ -0,0 +1,60 @@
+# page_cache.py
+import threading
+import weakref
+from collections import OrderedDict
+from itertools import count
+
+# Rendered HTML pages kept in a size-bounded LRU. Pages of a table are keyed by
+# a token that the table's change listener replaces on every change, so stale
+# pages are never served and simply age out; catalog pages are keyed by the
+# catalog contents they show.
+
+DEFAULT_PAGE_CACHE_BYTES = 16 * 1024 * 1024
+
+
+class PageCache:
+    def __init__(self, max_bytes: int = DEFAULT_PAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._pages = OrderedDict()  # Key -> HTML
+        self._tokens = weakref.WeakKeyDictionary()  # Table -> token of its current contents
+        self._counter = count()
+        self._lock = threading.Lock()
+
+    def table_token(self, table) -> int:
+        """Token identifying the current contents of a table; changes whenever the table does."""
+        with self._lock:
+            token = self._tokens.get(table)
+            if token is None:
+                token = self._tokens[table] = next(self._counter)
+                table.subscribe(self._on_change)
+            return token
+
+    def _on_change(self, table, event: str, data: dict):
+        with self._lock:
+            self._tokens[table] = next(self._counter)
+
+    def get(self, key):
+        with self._lock:
+            html = self._pages.get(key)
+            if html is not None:
+                self._pages.move_to_end(key)
+            return html
+
+    def put(self, key, html: str):
+        with self._lock:
+            if key in self._pages:
+                return
+            self._pages[key] = html
+            self.size += len(html)
+            while self.size > self.max_bytes:
+                _, evicted = self._pages.popitem(last=False)
+                self.size -= len(evicted)
+
+    def render(self, key, render) -> str:
+        """Cached HTML for `key`, calling render() on a miss."""
+        html = self.get(key)
+        if html is None:
+            html = render()
+            self.put(key, html)
+        return html
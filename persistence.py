@@ -0,0 +1,232 @@
+# persistence.py
+import datetime
+import json
+import mmap
+import os
+import pickle
+import re
+import struct
+import sys
+import zlib
+from array import array
+
+from attributes import Attribute
+from database import Database
+from schema import Schema
+from storage import make_column, ArrayColumn, StringColumn, ObjectColumn
+from table import Table
+
+# One binary, columnar file per table plus a JSON catalog:
+#
+#   MAGIC | header length (uint32 LE) | header JSON | buffer bytes ...
+#
+# The header describes the table (schema, row ids) and where every buffer
+# starts. Buffers are the raw array/bytearray contents of the columns, each
+# optionally zlib-compressed, so loading is a memory-mapped read plus a
+# frombytes() per buffer.
+#
+# Every save_all() is a new generation: its table files carry the generation
+# in their names, so the files the current catalog points to are never
+# overwritten. The catalog is replaced atomically and only then are the
+# previous generation's files deleted; a crash at any point leaves a catalog
+# whose tables match its wal_lsn.
+
+MAGIC = b'TBLSNAP1'
+CATALOG_FILE = 'catalog.json'
+TABLE_SUFFIX = '.tbl'
+
+
+def _table_file_name(db_name: str, table_name: str, generation: int) -> str:
+    safe = re.sub(r'[^A-Za-z0-9_-]', '_', f"{db_name}__{table_name}")
+    return f"{safe}-{zlib.crc32(f'{db_name}/{table_name}'.encode('utf-8')):08x}.g{generation}{TABLE_SUFFIX}"
+
+
+def _fsync_directory(directory: str):
+    # Make renames in `directory` durable (not possible on every platform)
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _column_buffers(column) -> list:
+    if isinstance(column, ArrayColumn):
+        return [('data', column.data.typecode, column.data.tobytes())]
+    if isinstance(column, StringColumn):
+        return [('offsets', 'q', column.offsets.tobytes()),
+                ('lengths', 'q', column.lengths.tobytes()),
+                ('data', None, bytes(column.data))]
+    return [('objects', None, pickle.dumps(list(column.values()), protocol=pickle.HIGHEST_PROTOCOL))]
+
+
+def save_table(table: Table, file_path: str, compress: bool = False):
+    """Write one table snapshot atomically (temp file + rename)."""
+    columns = table.columns  # Dense: live rows only
+    buffers = [(None, 'ids', 'q', array('q', table.row_ids()).tobytes())]
+    for position, column in enumerate(columns):
+        for part, typecode, raw in _column_buffers(column):
+            buffers.append((position, part, typecode, raw))
+
+    entries = []
+    payloads = []
+    offset = 0
+    for position, part, typecode, raw in buffers:
+        stored = zlib.compress(raw, 1) if compress else raw
+        entries.append({'column': position, 'part': part, 'typecode': typecode,
+                        'offset': offset, 'length': len(stored)})
+        payloads.append(stored)
+        offset += len(stored)
+
+    header = json.dumps({
+        'name': table.name,
+        'attributes': [{'name': attr.name, 'data_type': attr.data_type, 'nullable': attr.nullable}
+                       for attr in table.schema.attributes],
+        'primary_key': table.schema.primary_key,
+        'indexes': [{'attribute': attribute, 'kind': kind} for attribute, kind in table.indexes.items()],
+        'next_id': table._next_id,
+        'row_count': table.row_count(),
+        'byteorder': sys.byteorder,
+        'compression': 'zlib' if compress else None,
+        'buffers': entries,
+    }).encode('utf-8')
+
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(struct.pack('<I', len(header)))
+        file.write(header)
+        for payload in payloads:
+            file.write(payload)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, file_path)
+
+
+def load_table(file_path: str) -> Table:
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            raise ValueError(f"Empty snapshot file: {file_path}")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                return _read_table(view, file_path)
+            finally:
+                view.release()
+
+
+def _read_table(view: memoryview, file_path: str) -> Table:
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"Not a table snapshot: {file_path}")
+    header_length, = struct.unpack('<I', view[len(MAGIC):len(MAGIC) + 4])
+    body_start = len(MAGIC) + 4 + header_length
+    header = json.loads(bytes(view[len(MAGIC) + 4:body_start]).decode('utf-8'))
+    compressed = header['compression'] == 'zlib'
+    swap = header['byteorder'] != sys.byteorder
+
+    def read(entry):
+        start = body_start + entry['offset']
+        raw = view[start:start + entry['length']]
+        return zlib.decompress(raw) if compressed else raw
+
+    def read_array(entry):
+        values = array(entry['typecode'])
+        values.frombytes(read(entry))
+        if swap:
+            values.byteswap()
+        return values
+
+    attributes = [Attribute(attr['name'], attr['data_type'], attr['nullable']) for attr in header['attributes']]
+    schema = Schema(attributes, primary_key=header['primary_key'])
+    parts = [{} for _ in attributes]
+    ids = array('q')
+    for entry in header['buffers']:
+        if entry['part'] == 'ids':
+            ids = read_array(entry)
+        else:
+            parts[entry['column']][entry['part']] = entry
+
+    columns = []
+    for attr, column_parts in zip(attributes, parts):
+        column = make_column(attr.data_type, attr.nullable)
+        if isinstance(column, ArrayColumn):
+            column = type(column)(read_array(column_parts['data']))
+        elif isinstance(column, StringColumn):
+            column = StringColumn(read_array(column_parts['offsets']), read_array(column_parts['lengths']),
+                                  bytearray(read(column_parts['data'])))
+        else:
+            column = ObjectColumn(pickle.loads(read(column_parts['objects'])))
+        columns.append(column)
+    table = Table.from_columns(header['name'], schema, columns, ids=ids, next_id=header['next_id'])
+    for index in header.get('indexes', []):
+        table.create_index(index['attribute'], index['kind'])
+    return table
+
+
+def save_all(databases: dict, directory: str, compress: bool = False, wal_lsn: int = None):
+    """Snapshot every database into `directory`; the catalog is replaced last.
+
+    `wal_lsn` records the last write-ahead log record the snapshot includes.
+    """
+    os.makedirs(directory, exist_ok=True)
+    generation = ((_read_catalog(directory) or {}).get('generation') or 0) + 1
+    catalog = {'saved_at': datetime.datetime.now().isoformat(), 'wal_lsn': wal_lsn,
+               'generation': generation, 'databases': []}
+    written = set()
+    for db_name, db in databases.items():
+        tables = []
+        for table_name, table in db.tables.items():
+            file_name = _table_file_name(db_name, table_name, generation)
+            save_table(table, os.path.join(directory, file_name), compress=compress)
+            tables.append({'name': table_name, 'file': file_name})
+            written.add(file_name)
+        catalog['databases'].append({'name': db_name, 'tables': tables})
+
+    tmp_path = os.path.join(directory, CATALOG_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(catalog, file, ensure_ascii=False, indent=2)
+        file.flush()
+        os.fsync(file.fileno())
+    _fsync_directory(directory)  # The new table files exist before the catalog refers to them
+    os.replace(tmp_path, os.path.join(directory, CATALOG_FILE))
+    _fsync_directory(directory)
+
+    # Earlier generations (and files of dropped tables) are no longer referenced by the new catalog
+    for file_name in os.listdir(directory):
+        if file_name.endswith((TABLE_SUFFIX, TABLE_SUFFIX + '.tmp')) and file_name not in written:
+            os.remove(os.path.join(directory, file_name))
+
+
+def _read_catalog(directory: str):
+    catalog_path = os.path.join(directory, CATALOG_FILE)
+    if not os.path.exists(catalog_path):
+        return None
+    with open(catalog_path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def catalog_lsn(directory: str) -> int:
+    """Last write-ahead log record included in the saved snapshot (0 if none)."""
+    catalog = _read_catalog(directory)
+    return (catalog or {}).get('wal_lsn') or 0
+
+
+def load_all(directory: str) -> dict:
+    """Load the databases saved by save_all; an empty dict if nothing was saved yet."""
+    catalog = _read_catalog(directory)
+    if catalog is None:
+        return {}
+    databases = {}
+    for db_entry in catalog['databases']:
+        db = Database(db_entry['name'])
+        for table_entry in db_entry['tables']:
+            table = load_table(os.path.join(directory, table_entry['file']))
+            table.name = table_entry['name']
+            db.create_table(table)
+        databases[db.name] = db
+    return databases
@@ -0,0 +1,202 @@
+# query.py
+import re
+from itertools import islice
+
+from row import Row
+from schema import Schema
+from table import Table
+from data_types import get_parser
+from indexes import COMPARISONS
+from operations import chunked, DEFAULT_CHUNK_SIZE
+
+# Iterator-based (Volcano-style) relational operators. Every operator exposes
+# a `schema` and yields Rows lazily, so a tree of operators only materializes
+# what the final consumer asks for.
+
+class Predicate:
+    """Typed comparison `attribute op value`; the value is parsed with the attribute's data type."""
+
+    def __init__(self, attribute: str, op: str, value):
+        if op not in COMPARISONS:
+            raise ValueError(f"Unknown comparison operator: {op}")
+        self.attribute = attribute
+        self.op = op
+        self.value = value
+
+    def condition(self, schema: Schema) -> tuple:
+        """(attribute, op, parsed value) as accepted by Table.find."""
+        for attr in schema.attributes:
+            if attr.name == self.attribute:
+                break
+        else:
+            raise ValueError(f"Attribute '{self.attribute}' not found.")
+        try:
+            return self.attribute, self.op, get_parser(attr.data_type)(self.value)
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid value for '{self.attribute}': {e}") from e
+
+    def bind(self, schema: Schema):
+        """Return a test function over value tuples of the given schema."""
+        _, _, value = self.condition(schema)
+        position = schema.names.index(self.attribute)
+        compare = COMPARISONS[self.op]
+
+        def test(values):
+            current = values[position]
+            return current is not None and compare(current, value)
+        return test
+
+
+FILTER_PATTERN = re.compile(r'^(.+?)(<=|>=|!=|=|<|>)(.*)$')
+
+
+def parse_predicate(text: str) -> Predicate:
+    """Parse the textual filter form `attribute<op>value`, e.g. "age>=30" or "name=Ann"."""
+    match = FILTER_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Invalid filter '{text}'; expected attribute<op>value.")
+    attribute, op, value = match.groups()
+    return Predicate(attribute.strip(), op, value.strip())
+
+
+class Scan:
+    def __init__(self, table: Table):
+        self.table = table
+        self.schema = table.schema
+
+    def __iter__(self):
+        return iter(self.table.rows)
+
+
+class Select:
+    def __init__(self, child, predicates: list):
+        self.child = child
+        self.schema = child.schema
+        self._tests = [predicate.bind(child.schema) for predicate in predicates]
+
+    def __iter__(self):
+        tests = self._tests
+        for row in self.child:
+            if all(test(row.values) for test in tests):
+                yield row
+
+
+class Project:
+    def __init__(self, child, attributes: list):
+        by_name = {attr.name: (position, attr) for position, attr in enumerate(child.schema.attributes)}
+        missing = [name for name in attributes if name not in by_name]
+        if missing:
+            raise ValueError(f"Attribute(s) not found: {', '.join(missing)}")
+        self.child = child
+        self._positions = [by_name[name][0] for name in attributes]
+        self.schema = Schema([by_name[name][1] for name in attributes])
+
+    def __iter__(self):
+        names, positions = self.schema.names, self._positions
+        for row in self.child:
+            values = row.values
+            yield Row.from_values(names, tuple(values[i] for i in positions))
+
+
+class SetOperation:
+    """Base for distinct set operations over two inputs with the same schema."""
+
+    def __init__(self, left, right):
+        left_signature = [(attr.name, attr.data_type) for attr in left.schema.attributes]
+        right_signature = [(attr.name, attr.data_type) for attr in right.schema.attributes]
+        if left_signature != right_signature:
+            raise ValueError("Set operations require inputs with identical attributes.")
+        self.left = left
+        self.right = right
+        self.schema = left.schema
+
+
+class Union(SetOperation):
+    def __iter__(self):
+        seen = set()
+        for source in (self.left, self.right):
+            for row in source:
+                if row not in seen:
+                    seen.add(row)
+                    yield row
+
+
+class Difference(SetOperation):
+    def __iter__(self):
+        excluded = set(self.right)  # Only the right input is held in memory
+        for row in self.left:
+            if row not in excluded:
+                excluded.add(row)
+                yield row
+
+
+class Intersection(SetOperation):
+    def __iter__(self):
+        candidates = set(self.right)
+        for row in self.left:
+            if row in candidates:
+                candidates.discard(row)
+                yield row
+
+
+SET_OPERATIONS = {'union': Union, 'difference': Difference, 'intersection': Intersection}
+
+
+def _field(node: dict, name: str, expected: type, description: str):
+    # A required field of a plan node, checked for its JSON type
+    value = node[name]
+    if not isinstance(value, expected):
+        raise ValueError(f"Field '{name}' of plan node '{node['op']}' must be {description}.")
+    return value
+
+
+def _conditions(node: dict) -> list:
+    predicates = []
+    for cond in _field(node, 'where', list, "a list of conditions"):
+        if not isinstance(cond, dict):
+            raise ValueError("Each condition must be a JSON object with 'attribute', 'op' and 'value'.")
+        if not isinstance(cond['attribute'], str) or not isinstance(cond['op'], str):
+            raise ValueError("Condition 'attribute' and 'op' must be strings.")
+        predicates.append(Predicate(cond['attribute'], cond['op'], cond['value']))
+    return predicates
+
+
+def build_plan(node: dict, resolve_table):
+    """Build an operator tree from its JSON description.
+
+    resolve_table maps a "db_name.table_name" string to a Table. Nodes:
+      {"op": "scan", "table": "db.table"}
+      {"op": "select", "input": node, "where": [{"attribute": a, "op": "<", "value": v}, ...]}
+      {"op": "project", "input": node, "attributes": [a, ...]}
+      {"op": "union" | "difference" | "intersection", "left": node, "right": node}
+    """
+    if not isinstance(node, dict):
+        raise ValueError("Each plan node must be a JSON object.")
+    op = node.get('op')
+    try:
+        if op == 'scan':
+            return Scan(resolve_table(_field(node, 'table', str, "a 'db_name.table_name' string")))
+        if op == 'select':
+            return Select(build_plan(node['input'], resolve_table), _conditions(node))
+        if op == 'project':
+            attributes = _field(node, 'attributes', list, "a list of attribute names")
+            if not all(isinstance(name, str) for name in attributes):
+                raise ValueError("Projected attributes must be strings.")
+            return Project(build_plan(node['input'], resolve_table), attributes)
+        if op in SET_OPERATIONS:
+            return SET_OPERATIONS[op](build_plan(node['left'], resolve_table),
+                                      build_plan(node['right'], resolve_table))
+    except KeyError as e:
+        raise ValueError(f"Plan node '{op}' is missing field {e}.") from None
+    raise ValueError(f"Unknown plan operator: {op}")
+
+
+def materialize(plan, new_table_name: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Table:
+    table = Table(new_table_name, Schema(list(plan.schema.attributes)))
+    for chunk in chunked((row.values for row in plan), chunk_size):
+        table.append_values(chunk)
+    return table
+
+
+def fetch(plan, limit: int = None) -> list:
+    return list(islice(plan, limit))
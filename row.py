@@ -1,13 +1,67 @@
 # row.py
 
+from collections.abc import Mapping
+
+
+class RowData(Mapping):
+    """Read-only mapping view over a Row's positional values."""
+    __slots__ = ('_row',)
+
+    def __init__(self, row: 'Row'):
+        self._row = row
+
+    def __getitem__(self, key):
+        try:
+            return self._row.values[self._row.names.index(key)]
+        except ValueError:
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        return iter(self._row.names)
+
+    def __len__(self):
+        return len(self._row.names)
+
+    def copy(self) -> dict:
+        return dict(zip(self._row.names, self._row.values))
+
+    def __repr__(self):
+        return repr(self.copy())
+
+
 class Row:
+    __slots__ = ('names', 'values', 'row_id', '_hash')
+
     def __init__(self, data: dict):
-        self.data = data  # Key: Attribute name, Value: Data
+        self.names = tuple(data)  # Attribute names, shared with the Schema when built by a Table
+        self.values = tuple(data.values())
+        self.row_id = None  # Stable id assigned by the Table the row was read from
+        self._hash = None
+
+    @classmethod
+    def from_values(cls, names: tuple, values: tuple, row_id: int = None) -> 'Row':
+        row = cls.__new__(cls)
+        row.names = names
+        row.values = values
+        row.row_id = row_id
+        row._hash = None
+        return row
+
+    @property
+    def data(self) -> RowData:
+        return RowData(self)  # Key: Attribute name, Value: Data
 
     def __eq__(self, other):
         if isinstance(other, Row):
-            return self.data == other.data
+            if self.names is other.names or self.names == other.names:
+                return self.values == other.values
+            return self.data.copy() == other.data.copy()
         return False
 
     def __hash__(self):
-        return hash(frozenset(self.data.items()))        
+        if self._hash is None:
+            self._hash = hash(frozenset(zip(self.names, self.values)))
+        return self._hash
+
+    def __repr__(self):
+        return f"Row({self.data.copy()!r})"
@@ -1,5 +1,38 @@
 # schema.py
 
+from data_types import get_parser
+
+
+class SchemaValidationError(ValueError):
+    def __init__(self, attribute, data_type, reason):
+        super().__init__(f"Invalid data type for attribute {attribute}. Expected {data_type}.")
+        self.attribute = attribute
+        self.data_type = data_type
+        self.reason = reason
+
+
 class Schema:
-    def __init__(self, attributes: list):
+    def __init__(self, attributes: list, primary_key: str = None):
         self.attributes = attributes  # List of Attribute instances
+        self.primary_key = primary_key  # Optional name of a unique, non-null attribute
+        # Compiled once: attribute order and one parser per attribute
+        self.names = tuple(attr.name for attr in attributes)
+        self._fields = tuple((attr.name, attr.data_type, get_parser(attr.data_type, attr.nullable))
+                             for attr in attributes)
+        self.key_position = None
+        if primary_key is not None:
+            if primary_key not in self.names:
+                raise ValueError(f"Primary key attribute '{primary_key}' is not in the schema.")
+            self.key_position = self.names.index(primary_key)
+            if attributes[self.key_position].nullable:
+                raise ValueError("Primary key attribute cannot be nullable.")
+
+    def parse_row(self, data) -> tuple:
+        """Parse a mapping of raw values into a tuple in attribute order."""
+        values = []
+        for name, data_type, parse in self._fields:
+            try:
+                values.append(parse(data.get(name)))
+            except (ValueError, TypeError) as e:
+                raise SchemaValidationError(name, data_type, str(e)) from e
+        return tuple(values)
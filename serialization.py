@@ -0,0 +1,265 @@
+# serialization.py
+import datetime
+import hashlib
+import json
+import secrets
+import struct
+import sys
+import threading
+import weakref
+from array import array
+from collections import OrderedDict
+from itertools import count
+
+# JSON encoding matching FastAPI's JSONResponse, plus a byte-bounded LRU cache
+# of encoded rows. Row ids are never reused, so an insert never invalidates
+# anything; updates and deletes drop the affected rows, and a schema change
+# retires every entry of the table at once.
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+ENTRY_OVERHEAD = 100  # Rough per-entry cost of the key tuple and the OrderedDict node
+
+
+def json_default(value):
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+_encoder = json.JSONEncoder(default=json_default, ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+
+
+def encode_json(value) -> bytes:
+    return _encoder.encode(value).encode('utf-8')
+
+
+class RowJsonCache:
+    """Encoded `{"attribute": value, ...}` objects per (table, row id), evicted least recently used first."""
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # (table token, row id) -> bytes
+        self._tokens = weakref.WeakKeyDictionary()  # Table -> token of its current schema
+        self._counter = count()
+        self._invalidations = 0  # Entries encoded from values read before an invalidation are not kept
+        self._lock = threading.Lock()
+
+    def _token(self, table) -> int:
+        token = self._tokens.get(table)
+        if token is None:
+            token = self._tokens[table] = next(self._counter)
+            table.subscribe(self._on_change)
+        return token
+
+    def _on_change(self, table, event: str, data: dict):
+        with self._lock:
+            token = self._tokens.get(table)
+            if event not in ('insert', 'insert_many'):
+                self._invalidations += 1
+            if event == 'update' or event == 'delete':
+                self._discard((token, data['row_id']))
+            elif event == 'delete_many':
+                for row_id in data['row_ids']:
+                    self._discard((token, row_id))
+            elif event == 'schema':
+                self._tokens[table] = next(self._counter)  # Old entries age out of the LRU
+
+    def _discard(self, key):
+        encoded = self._entries.pop(key, None)
+        if encoded is not None:
+            self.size -= len(encoded) + ENTRY_OVERHEAD
+
+    def _encode(self, table, row_id: int, values, with_id: bool, invalidations: int) -> bytes:
+        with self._lock:
+            key = (self._token(table), row_id)
+            encoded = self._entries.get(key)
+            if encoded is not None:
+                self._entries.move_to_end(key)
+        if encoded is None:
+            encoded = encode_json(dict(zip(table.schema.names, values)))
+            with self._lock:
+                if invalidations == self._invalidations and key not in self._entries:
+                    self._entries[key] = encoded
+                    self.size += len(encoded) + ENTRY_OVERHEAD
+                    while self.size > self.max_bytes:
+                        _, evicted = self._entries.popitem(last=False)
+                        self.size -= len(evicted) + ENTRY_OVERHEAD
+        if with_id:
+            prefix = b'{"_id":%d' % row_id
+            return prefix + (b',' + encoded[1:] if len(encoded) > 2 else b'}')
+        return encoded
+
+    def encode_row(self, table, row_id: int, with_id: bool = False) -> bytes:
+        """One row as JSON; raises KeyError for an unknown row id."""
+        invalidations = self._invalidations
+        return self._encode(table, row_id, table.get_row_by_id(row_id).values, with_id, invalidations)
+
+    def encode_rows(self, table, items, with_ids: bool = False) -> bytes:
+        """JSON array of lazily produced (row id, values) items, built from cached row bytes."""
+        invalidations = self._invalidations
+        return b'[' + b','.join(self._encode(table, row_id, values, with_ids, invalidations)
+                                for row_id, values in items) + b']'
+
+
+# Columnar wire formats, chosen through the Accept header.
+#
+# Columnar JSON: {"attributes": [{"name", "data_type", "nullable"}, ...],
+#                 "row_count": n, "ids": [...] (optional), "columns": [[...], ...]}
+#
+# Columnar binary: MAGIC | header length (uint32 LE) | header JSON | padding | buffers
+# Every buffer is little-endian and starts on an 8-byte boundary, so a NumPy
+# client reads it with np.frombuffer(body, dtype, count, offset=body_start + offset)
+# where body_start is the header's "body_offset". Buffers per column:
+#   integer -> values "<i8"; real -> values "<f8"; date -> values "<M8[D]" (days since 1970-01-01)
+#   anything else -> UTF-8 "data" bytes plus "offsets" "<i8" (row_count + 1 entries)
+#   nullable columns add a "validity" "|u1" mask (1 = value present; absent values are zeros)
+
+JSON_MEDIA_TYPE = 'application/json'
+COLUMNAR_JSON_MEDIA_TYPE = 'application/vnd.table.columnar+json'
+COLUMNAR_BINARY_MEDIA_TYPE = 'application/vnd.table.columnar'
+COLUMNAR_MAGIC = b'TBLCOLS1'
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+_NUMERIC_BUFFERS = {'integer': ('q', '<i8'), 'int': ('q', '<i8'), 'real': ('d', '<f8')}
+
+# Versions restart at 1 in every process while the data outlives it (snapshots,
+# WAL), so ETags are keyed by a secret drawn at startup: a tag handed out
+# before a restart never matches afterwards.
+BOOT_KEY = secrets.token_bytes(16)
+
+
+def make_etag(version: int, *variant) -> str:
+    """Strong ETag for one version of a resource; `variant` lists whatever else shapes the body
+    (query parameters, media type)."""
+    digest = hashlib.blake2b(repr(variant).encode('utf-8'), digest_size=8, key=BOOT_KEY).hexdigest()
+    return f'"{version}-{digest}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match check; uses weak comparison as RFC 9110 asks for GET."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return etag in (tag.strip().removeprefix('W/') for tag in if_none_match.split(','))
+
+
+def negotiate(accept: str, offers: list) -> str:
+    """Pick the offered media type the Accept header prefers; offers[0] when nothing matches."""
+    ranked = []
+    for position, part in enumerate((accept or '').split(',')):
+        media_type, *params = [piece.strip() for piece in part.split(';')]
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        ranked.append((-quality, position, media_type.lower()))
+    for quality, _, media_type in sorted(ranked):
+        if quality == 0:
+            break
+        if media_type in offers:
+            return media_type
+        if media_type in ('*/*', 'application/*'):
+            return offers[0]
+    return offers[0]
+
+
+def encode_columnar_json(attributes: list, columns: list, ids=None) -> bytes:
+    """Schema once plus one value array per column; `columns` holds iterables of values."""
+    columns = [list(values) for values in columns]
+    ids = list(ids) if ids is not None else None
+    document = {
+        'attributes': [{'name': attr.name, 'data_type': attr.data_type, 'nullable': attr.nullable}
+                       for attr in attributes],
+        'row_count': len(columns[0]) if columns else len(ids or ()),
+    }
+    if ids is not None:
+        document['ids'] = ids
+    document['columns'] = columns
+    return encode_json(document)
+
+
+def _column_parts(attr, values: list) -> list:
+    # (part name, dtype, raw little-endian bytes) for one column
+    parts = []
+    if attr.nullable:
+        parts.append(('validity', '|u1', bytes(value is not None for value in values)))
+    if attr.data_type in _NUMERIC_BUFFERS:
+        typecode, dtype = _NUMERIC_BUFFERS[attr.data_type]
+        buffer = array(typecode, (0 if value is None else value for value in values))
+        parts.append(('values', dtype, buffer))
+    elif attr.data_type == 'date':
+        buffer = array('q', (0 if value is None else value.toordinal() - EPOCH_ORDINAL for value in values))
+        parts.append(('values', '<M8[D]', buffer))
+    else:
+        offsets = array('q', [0])
+        data = bytearray()
+        for value in values:
+            if value is not None:
+                data += str(value).encode('utf-8')
+            offsets.append(len(data))
+        parts.append(('offsets', '<i8', offsets))
+        parts.append(('data', '|u1', bytes(data)))
+    encoded = []
+    for name, dtype, buffer in parts:
+        if isinstance(buffer, array):
+            if sys.byteorder == 'big':
+                buffer.byteswap()
+            buffer = buffer.tobytes()
+        encoded.append((name, dtype, buffer))
+    return encoded
+
+
+def _padding(length: int) -> bytes:
+    return b'\0' * (-length % 8)
+
+
+def encode_columnar_binary(attributes: list, columns: list, ids=None) -> bytes:
+    """Typed column buffers behind a JSON header; `columns` holds iterables of values."""
+    columns = [list(values) for values in columns]
+    row_count = len(columns[0]) if columns else (len(ids) if ids is not None else 0)
+    payloads = []
+    offset = 0
+
+    def add(dtype: str, raw: bytes) -> dict:
+        nonlocal offset
+        entry = {'dtype': dtype, 'offset': offset, 'length': len(raw)}
+        payloads.append(raw + _padding(len(raw)))
+        offset += len(payloads[-1])
+        return entry
+
+    header = {'row_count': row_count, 'columns': []}
+    if ids is not None:
+        id_buffer = array('q', ids)
+        if sys.byteorder == 'big':
+            id_buffer.byteswap()
+        header['ids'] = add('<i8', id_buffer.tobytes())
+    for attr, values in zip(attributes, columns):
+        header['columns'].append({
+            'name': attr.name, 'data_type': attr.data_type, 'nullable': attr.nullable,
+            'buffers': {name: add(dtype, raw) for name, dtype, raw in _column_parts(attr, values)},
+        })
+
+    # The header states where the body starts, so its own length is fixed first
+    header['body_offset'] = 0
+    encoded_header = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    while True:
+        prefix_length = len(COLUMNAR_MAGIC) + 4 + len(encoded_header)
+        body_offset = prefix_length + (-prefix_length % 8)
+        if header['body_offset'] == body_offset:
+            break
+        header['body_offset'] = body_offset
+        encoded_header = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    return b''.join([COLUMNAR_MAGIC, struct.pack('<I', len(encoded_header)), encoded_header,
+                     _padding(prefix_length), *payloads])
+
+
+def encode_columnar(media_type: str, attributes: list, rows: list, ids=None) -> bytes:
+    """Encode value tuples (in `attributes` order) in one of the columnar media types."""
+    columns = list(zip(*rows)) if rows else [() for _ in attributes]
+    if media_type == COLUMNAR_BINARY_MEDIA_TYPE:
+        return encode_columnar_binary(attributes, columns, ids)
+    return encode_columnar_json(attributes, columns, ids)
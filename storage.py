@@ -0,0 +1,317 @@
+# storage.py
+import datetime
+from array import array
+from itertools import chain, repeat
+
+try:
+    import numpy as np
+except ImportError:  # NumPy only speeds up repeat/tile; everything works without it
+    np = None
+
+
+class Column:
+    """Typed, append-oriented buffer holding every value of one attribute."""
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def get(self, index: int):
+        raise NotImplementedError
+
+    def append(self, value):
+        raise NotImplementedError
+
+    def set(self, index: int, value):
+        raise NotImplementedError
+
+    def delete(self, index: int):
+        raise NotImplementedError
+
+    def pop(self):
+        self.delete(len(self) - 1)
+
+    def truncate(self, length: int):
+        while len(self) > length:
+            self.pop()
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def extend_column(self, other: 'Column'):
+        """Append every value of another column of the same type."""
+        self.extend(other.values())
+
+    def values(self):
+        return (self.get(i) for i in range(len(self)))
+
+    def take(self, indices) -> 'Column':
+        column = self.empty()
+        for i in indices:
+            column.append(self.get(i))
+        return column
+
+    def empty(self) -> 'Column':
+        return type(self)()
+
+    def copy(self) -> 'Column':
+        return self.take(range(len(self)))
+
+    def repeat(self, count: int) -> 'Column':
+        """New column with every value repeated `count` times in place (a, a, b, b)."""
+        return self.take(chain.from_iterable(repeat(i, count) for i in range(len(self))))
+
+    def tile(self, count: int) -> 'Column':
+        """New column with the whole column repeated `count` times (a, b, a, b)."""
+        return self.take(chain.from_iterable(repeat(range(len(self)), count)))
+
+
+class ArrayColumn(Column):
+    """Fixed-width numeric values stored in an array.array buffer.
+
+    `data` is the raw buffer; aggregates such as sum(column.data) or
+    max(column.data) run over it without creating per-row objects.
+    """
+    typecode = None
+
+    def __init__(self, data=None):
+        self.data = data if data is not None else array(self.typecode)
+
+    def __len__(self):
+        return len(self.data)
+
+    def encode(self, value):
+        return value
+
+    def decode(self, raw):
+        return raw
+
+    def get(self, index: int):
+        return self.decode(self.data[index])
+
+    def append(self, value):
+        try:
+            self.data.append(self.encode(value))
+        except OverflowError as e:
+            raise ValueError(f"Value {value!r} does not fit into a 64-bit column.") from e
+
+    def set(self, index: int, value):
+        try:
+            self.data[index] = self.encode(value)
+        except OverflowError as e:
+            raise ValueError(f"Value {value!r} does not fit into a 64-bit column.") from e
+
+    def delete(self, index: int):
+        del self.data[index]
+
+    def truncate(self, length: int):
+        del self.data[length:]
+
+    def extend(self, values):
+        try:
+            if type(self).encode is ArrayColumn.encode:
+                self.data.extend(values)
+            else:
+                self.data.extend(map(self.encode, values))
+        except OverflowError as e:
+            raise ValueError(f"Value does not fit into a 64-bit column: {e}") from e
+
+    def extend_column(self, other: 'Column'):
+        self.data.extend(other.data)
+
+    def values(self):
+        if type(self).decode is ArrayColumn.decode:
+            return iter(self.data)
+        return map(self.decode, self.data)
+
+    def take(self, indices) -> 'Column':
+        data = self.data
+        return type(self)(array(self.typecode, [data[i] for i in indices]))
+
+    def copy(self) -> 'Column':
+        return type(self)(self.data[:])
+
+    def repeat(self, count: int) -> 'Column':
+        if np is not None:
+            return type(self)(array(self.typecode, np.repeat(self.to_numpy(), count).tobytes()))
+        return type(self)(array(self.typecode, chain.from_iterable(repeat(value, count) for value in self.data)))
+
+    def tile(self, count: int) -> 'Column':
+        return type(self)(self.data * count)
+
+    def to_numpy(self):
+        """Zero-copy NumPy view of the buffer (requires numpy)."""
+        import numpy as np
+        return np.frombuffer(self.data, dtype=self.data.typecode)
+
+
+class IntegerColumn(ArrayColumn):
+    typecode = 'q'
+
+
+class RealColumn(ArrayColumn):
+    typecode = 'd'
+
+
+class DateColumn(ArrayColumn):
+    """Dates stored as proleptic Gregorian ordinals."""
+    typecode = 'q'
+
+    def encode(self, value):
+        return value.toordinal()
+
+    def decode(self, raw):
+        return datetime.date.fromordinal(raw)
+
+
+class StringColumn(Column):
+    """UTF-8 strings packed into one bytearray, addressed by offset and length.
+
+    Rewriting a value appends the new bytes and leaves the old ones as
+    garbage; the buffer is compacted once garbage outweighs live data.
+    """
+
+    def __init__(self, offsets=None, lengths=None, data=None):
+        self.offsets = offsets if offsets is not None else array('q')
+        self.lengths = lengths if lengths is not None else array('q')
+        self.data = data if data is not None else bytearray()
+        self.garbage = 0
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def get(self, index: int):
+        start = self.offsets[index]
+        return self.data[start:start + self.lengths[index]].decode('utf-8')
+
+    def append(self, value):
+        encoded = str(value).encode('utf-8')
+        self.offsets.append(len(self.data))
+        self.lengths.append(len(encoded))
+        self.data += encoded
+
+    def set(self, index: int, value):
+        encoded = str(value).encode('utf-8')
+        start, length = self.offsets[index], self.lengths[index]
+        if len(encoded) == length:
+            self.data[start:start + length] = encoded
+            return
+        self.garbage += length
+        self.offsets[index] = len(self.data)
+        self.lengths[index] = len(encoded)
+        self.data += encoded
+        self._maybe_compact()
+
+    def delete(self, index: int):
+        self.garbage += self.lengths[index]
+        del self.offsets[index]
+        del self.lengths[index]
+        self._maybe_compact()
+
+    def truncate(self, length: int):
+        self.garbage += sum(self.lengths[length:])
+        del self.offsets[length:]
+        del self.lengths[length:]
+
+    def extend_column(self, other: 'Column'):
+        base = len(self.data)
+        self.offsets.extend(offset + base for offset in other.offsets)
+        self.lengths.extend(other.lengths)
+        self.data += other.data
+        self.garbage += other.garbage
+
+    def values(self):
+        data = self.data
+        for start, length in zip(self.offsets, self.lengths):
+            yield data[start:start + length].decode('utf-8')
+
+    def take(self, indices) -> 'Column':
+        column = StringColumn()
+        data, offsets, lengths = self.data, self.offsets, self.lengths
+        for i in indices:
+            start = offsets[i]
+            column.offsets.append(len(column.data))
+            column.lengths.append(lengths[i])
+            column.data += data[start:start + lengths[i]]
+        return column
+
+    def repeat(self, count: int) -> 'Column':
+        # Repeated values point at the same bytes, so only the offsets grow
+        if np is not None:
+            offsets = array('q', np.repeat(np.frombuffer(self.offsets, dtype='q'), count).tobytes())
+            lengths = array('q', np.repeat(np.frombuffer(self.lengths, dtype='q'), count).tobytes())
+        else:
+            offsets = array('q', chain.from_iterable(repeat(offset, count) for offset in self.offsets))
+            lengths = array('q', chain.from_iterable(repeat(length, count) for length in self.lengths))
+        return StringColumn(offsets, lengths, bytearray(self.data))
+
+    def tile(self, count: int) -> 'Column':
+        return StringColumn(self.offsets * count, self.lengths * count, bytearray(self.data))
+
+    def copy(self) -> 'Column':
+        column = StringColumn(self.offsets[:], self.lengths[:], bytearray(self.data))
+        column.garbage = self.garbage
+        return column
+
+    def _maybe_compact(self):
+        if self.garbage > 4096 and self.garbage * 2 > len(self.data):
+            compacted = self.take(range(len(self)))
+            self.offsets, self.lengths, self.data = compacted.offsets, compacted.lengths, compacted.data
+            self.garbage = 0
+
+
+class ObjectColumn(Column):
+    """Fallback column for values without a specialised buffer."""
+
+    def __init__(self, data=None):
+        self.data = data if data is not None else []
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, index: int):
+        return self.data[index]
+
+    def append(self, value):
+        self.data.append(value)
+
+    def set(self, index: int, value):
+        self.data[index] = value
+
+    def delete(self, index: int):
+        del self.data[index]
+
+    def truncate(self, length: int):
+        del self.data[length:]
+
+    def extend(self, values):
+        self.data.extend(values)
+
+    def values(self):
+        return iter(self.data)
+
+    def take(self, indices) -> 'Column':
+        data = self.data
+        return ObjectColumn([data[i] for i in indices])
+
+    def copy(self) -> 'Column':
+        return ObjectColumn(self.data[:])
+
+
+COLUMN_TYPES = {
+    'integer': IntegerColumn,
+    'int': IntegerColumn,
+    'real': RealColumn,
+    'date': DateColumn,
+    'char': StringColumn,
+    'string': StringColumn,
+    'str': StringColumn,
+    'file': StringColumn,
+    'int_interval': StringColumn,
+}
+
+
+def make_column(data_type: str, nullable: bool = False) -> Column:
+    if nullable:
+        return ObjectColumn()  # Typed buffers have no slot for None
+    return COLUMN_TYPES.get(data_type, ObjectColumn)()
@@ -1,43 +1,714 @@
 # table.py
 
-from data_types import validate_data
+from array import array
+from bisect import bisect_right
+from collections.abc import Sequence
+from itertools import compress, count, islice
+
 from row import Row
 from schema import Schema
+from storage import make_column
+from indexes import make_index, COMPARISONS
+
+# Deleted rows are only tombstoned; the buffers are compacted once at least
+# this many tombstones exist and they make up half of the slots. Compaction
+# only ever runs on the write path (delete, deduplicate): reads, which may run
+# without the writers' lock, never reorganize the buffers.
+COMPACT_MIN_DEAD = 1024
+
+# Versions of tables and databases come from one process-wide counter, so a
+# version names one state of one object: a table recreated under an old name
+# never repeats a version that was handed out before.
+_versions = count(1)
+
+
+def next_version() -> int:
+    return next(_versions)
+
+
+class RowsView(Sequence):
+    """Read-only list-like view that builds Row objects from the columns on demand."""
+
+    def __init__(self, table: 'Table'):
+        self._table = table
+
+    def __len__(self):
+        return self._table.row_count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("Row index out of range.")
+        return self._table.get_row(index)
+
+    def __iter__(self):
+        names = self._table.schema.names
+        for row_id, values in self._table.iter_items():
+            yield Row.from_values(names, values, row_id)
+
+
+def _compile_conditions(schema: Schema, conditions):
+    # Test function over value tuples for (attribute, op, parsed value) conditions
+    tests = []
+    for attribute, op, value in conditions:
+        if attribute not in schema.names:
+            raise ValueError(f"Attribute '{attribute}' not found.")
+        if op not in COMPARISONS:
+            raise ValueError(f"Unknown comparison operator: {op}")
+        tests.append((schema.names.index(attribute), COMPARISONS[op], value))
+
+    def matches(values):
+        for position, compare, value in tests:
+            current = values[position]
+            if current is None or not compare(current, value):
+                return False
+        return True
+    return matches
+
+
+class TableSnapshot:
+    """Rows of a table as they were when Table.snapshot() was called.
+
+    The snapshot shares the table's buffers; the table copies them before
+    its first in-place change, so reading never blocks writers and costs
+    no memory until then. Call close() (or use `with`) when done.
+    """
+
+    def __init__(self, table: 'Table', epoch: int):
+        self.schema = table.schema
+        self._table = table
+        self._epoch = epoch
+        self._columns = list(table._columns)
+        self._ids = table._ids
+        self._alive = table._alive
+        self._slot_count = len(table._ids)  # Rows appended later lie beyond this slot
+        self._row_count = table.row_count()
+
+    def row_count(self) -> int:
+        return self._row_count
+
+    def find(self, conditions=(), after_id: int = None):
+        """Yield (row id, values) in table order like Table.find, without using indexes."""
+        matches = _compile_conditions(self.schema, conditions)
+        ids, alive, count = self._ids, self._alive, self._slot_count
+        start = bisect_right(ids, after_id, 0, count) if after_id is not None else 0
+        if start:
+            columns = self._columns
+            items = ((ids[slot], tuple(column.get(slot) for column in columns))
+                     for slot in range(start, count) if alive[slot])
+        else:
+            items = compress(islice(zip(ids, zip(*[column.values() for column in self._columns])), count), alive)
+        if conditions:
+            return (item for item in items if matches(item[1]))
+        return items
+
+    def close(self):
+        self._table._release(self._epoch)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class BulkInsertError(ValueError):
+    def __init__(self, errors: list):
+        super().__init__(f"{len(errors)} row(s) failed validation; nothing was inserted.")
+        self.errors = errors  # List of (row position in the batch, message)
 
 
 class Table:
     def __init__(self, name: str, schema: Schema):
         self.name = name
-        self.schema = schema
-        self.rows = []  # List of Row instances
-
-    def insert_row(self, row: Row):
-        # Validate row against schema before inserting
-        for attr in self.schema.attributes:
-            value = row.data.get(attr.name)
-            if not validate_data(value, attr.data_type):
-                raise ValueError(f"Invalid data type for attribute {attr.name}. Expected {attr.data_type}.")
-        self.rows.append(row)
-
-    def update_row(self, index: int, row: Row):
-        # Validate row against schema before updating
-        for attr in self.schema.attributes:
-            value = row.data.get(attr.name)
-            if not validate_data(value, attr.data_type):
-                raise ValueError(f"Invalid data type for attribute {attr.name}. Expected {attr.data_type}.")
-        if index < 0 or index >= len(self.rows):
-            raise IndexError("Row index out of range.")
-        self.rows[index] = row
+        self._schema = schema
+        self._columns = [make_column(attr.data_type, attr.nullable) for attr in schema.attributes]  # One buffer per attribute
+        self._ids = array('q')  # Slot -> stable row id
+        self._alive = bytearray()  # Slot -> 1 for a live row, 0 for a tombstone
+        self._slots = {}  # Row id -> slot
+        self._keys = {}  # Primary key value -> row id
+        self._indexes = {}  # Attribute name -> (attribute position, secondary index)
+        self._next_id = 1
+        self._dead = 0
+        self._positions = None  # Live row position -> slot, rebuilt lazily after deletes
+        self._layout = 0  # Odd while the buffers are being swapped for new ones (compaction, copy-on-write)
+        self._pins = 0  # Open snapshots sharing the current buffers
+        self._epoch = 0  # Bumped whenever the buffers are copied away from snapshots
+        self._listeners = []  # Called as listener(table, event, data) after every change
+        self.version = next_version()  # Replaced by a higher number on every change of rows or schema
+
+    @classmethod
+    def from_columns(cls, name: str, schema: Schema, columns: list, ids: array = None,
+                     next_id: int = None) -> 'Table':
+        """Build a table around ready-made column buffers, validating per column rather than per cell.
+
+        `ids` and `next_id` restore previously assigned row ids (e.g. from a snapshot).
+        """
+        table = cls(name, schema)
+        table._check_columns(columns)
+        table._columns = list(columns)
+        count = len(columns[0]) if columns else 0
+        if ids is None:
+            table._assign_ids(count)
+        else:
+            if len(ids) != count:
+                raise ValueError("Row ids do not match the number of rows.")
+            table._next_id = next_id if next_id is not None else (max(ids) + 1 if ids else 1)
+            table._reset_ids(ids)
+        return table
+
+    def _check_columns(self, columns: list):
+        if len(columns) != len(self._columns):
+            raise ValueError(f"Expected {len(self._columns)} columns, got {len(columns)}.")
+        for attr, expected, column in zip(self.schema.attributes, self._columns, columns):
+            if type(column) is not type(expected):
+                raise ValueError(f"Column for attribute {attr.name} does not hold {attr.data_type} values.")
+        if len({len(column) for column in columns}) > 1:
+            raise ValueError("All columns must have the same length.")
+
+    def _assign_ids(self, count: int, first_id: int = None):
+        # Give ids to `count` rows just added at the end of the columns
+        start = len(self._ids)
+        if first_id is None:
+            first_id = self._next_id
+        elif first_id < self._next_id:
+            raise ValueError(f"Row id {first_id} was already assigned.")
+        self._ids.extend(range(first_id, first_id + count))
+        self._alive.extend(b'\x01' * count)
+        self._next_id = first_id + count
+        self._slots.update(zip(range(first_id, first_id + count), range(start, start + count)))
+        if self.schema.key_position is not None:
+            keys = self._columns[self.schema.key_position]
+            for slot in range(start, start + count):
+                self._keys[keys.get(slot)] = self._ids[slot]
+        for position, index in self._indexes.values():
+            column = self._columns[position]
+            if count == 1:
+                index.add(column.get(start), first_id)
+            else:
+                index.bulk_load(map(column.get, range(start, start + count)), range(first_id, first_id + count))
+
+    def subscribe(self, listener):
+        """Register listener(table, event, data), called after each insert, update, delete or schema change."""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def _notify(self, event: str, **data):
+        for listener in self._listeners:
+            listener(self, event, data)
+
+    @property
+    def schema(self) -> Schema:
+        return self._schema
 
-    def delete_row(self, index: int):
-        if index < 0 or index >= len(self.rows):
+    @schema.setter
+    def schema(self, schema: Schema):
+        if self.row_count():
+            raise ValueError("Cannot modify schema of a table that contains data. Please delete all rows first.")
+        self._schema = schema
+        self._layout += 1
+        self._columns = [make_column(attr.data_type, attr.nullable) for attr in schema.attributes]
+        self._ids = array('q')
+        self._alive = bytearray()
+        self._slots = {}
+        self._keys = {}
+        self._indexes = {}
+        self._dead = 0
+        self._positions = None
+        self._layout += 1
+        self.version = next_version()
+        if self._listeners:
+            self._notify('schema', schema=schema)
+
+    @property
+    def columns(self) -> list:
+        """Dense column buffers holding only live rows.
+
+        These are the table's own buffers when there are no tombstones, otherwise
+        compacted copies; the table itself is left as it is.
+        """
+        columns, alive = self._columns, self._alive
+        if not self._dead:
+            return columns
+        live = list(compress(range(len(alive)), alive))
+        return [column.take(live) for column in columns]
+
+    @property
+    def rows(self) -> RowsView:
+        return RowsView(self)
+
+    def row_count(self) -> int:
+        return len(self._slots)
+
+    def column(self, attr_name: str):
+        for position, attr in enumerate(self.schema.attributes):
+            if attr.name == attr_name:
+                column, alive = self._columns[position], self._alive
+                if not self._dead:
+                    return column
+                return column.take(list(compress(range(len(alive)), alive)))
+        raise KeyError(f"Attribute '{attr_name}' not found in table '{self.name}'.")
+
+    def _slot(self, index: int) -> int:
+        # Positions count live rows only; without tombstones they equal slots
+        if index < 0 or index >= self.row_count():
             raise IndexError("Row index out of range.")
-        del self.rows[index]
-
-    def delete_row(self, row: Row):
-        # Validate row against schema before inserting
-        for attr in self.schema.attributes:
-            value = row.data.get(attr.name)
-            if not validate_data(value, attr.data_type):
-                raise ValueError(f"Invalid data type for attribute {attr.name}. Expected {attr.data_type}.")
-        self.rows.remove(row)
\ No newline at end of file
+        if not self._dead:
+            return index
+        positions = self._positions
+        if positions is None or index >= len(positions):
+            # Appends only add positions at the end, so a map is valid until the next delete
+            positions = self._positions = array('q', compress(range(len(self._alive)), self._alive))
+        return positions[index]
+
+    def _slot_of_id(self, row_id: int) -> int:
+        try:
+            return self._slots[row_id]
+        except KeyError:
+            raise KeyError(f"Row id {row_id} not found.") from None
+
+    def _values_at(self, slot: int) -> tuple:
+        return tuple(column.get(slot) for column in self._columns)
+
+    def _buffers(self) -> tuple:
+        # (ids, alive, columns, slots) of one buffer layout, for reads without the writers' lock.
+        # Compaction and copy-on-write replace these objects rather than reorganize them,
+        # so a captured set stays consistent while the table moves on.
+        while True:
+            layout = self._layout
+            buffers = self._ids, self._alive, self._columns, self._slots
+            if not layout % 2 and layout == self._layout:
+                return buffers
+
+    def get_row(self, index: int) -> Row:
+        slot = self._slot(index)
+        return Row.from_values(self.schema.names, self._values_at(slot), self._ids[slot])
+
+    def get_values(self, index: int) -> tuple:
+        return self._values_at(self._slot(index))
+
+    def get_row_by_id(self, row_id: int) -> Row:
+        _, _, columns, slots = self._buffers()
+        if row_id not in slots:
+            raise KeyError(f"Row id {row_id} not found.")
+        return Row.from_values(self.schema.names, tuple(column.get(slots[row_id]) for column in columns), row_id)
+
+    def id_for_key(self, value) -> int:
+        """Row id holding the given (parsed) primary key value."""
+        if self.schema.primary_key is None:
+            raise ValueError(f"Table '{self.name}' has no primary key.")
+        try:
+            return self._keys[value]
+        except KeyError:
+            raise KeyError(f"No row with {self.schema.primary_key} = {value!r}.") from None
+
+    @property
+    def indexes(self) -> dict:
+        """Attribute name -> index kind ('hash' or 'sorted')."""
+        return {name: index.kind for name, (_, index) in self._indexes.items()}
+
+    def create_index(self, attribute: str, kind: str = 'hash'):
+        """Build a secondary index on one attribute; it is maintained on every change from then on."""
+        if attribute in self._indexes:
+            raise ValueError(f"Attribute '{attribute}' is already indexed.")
+        if attribute not in self.schema.names:
+            raise ValueError(f"Attribute '{attribute}' not found in table '{self.name}'.")
+        position = self.schema.names.index(attribute)
+        index = make_index(kind, attribute, self.schema.attributes[position].data_type)
+        index.bulk_load(self._live_values(position), self.row_ids())
+        self._indexes[attribute] = (position, index)
+        if self._listeners:
+            self._notify('create_index', attribute=attribute, kind=kind)
+
+    def drop_index(self, attribute: str):
+        if attribute not in self._indexes:
+            raise KeyError(f"No index on attribute '{attribute}'.")
+        del self._indexes[attribute]
+        if self._listeners:
+            self._notify('drop_index', attribute=attribute)
+
+    def _live_values(self, position: int):
+        values = self._columns[position].values()
+        if self._dead:
+            return compress(values, self._alive)
+        return values
+
+    def search_ids(self, attribute: str, op: str, value) -> list:
+        """Ids, in table order, of rows whose attribute compares true against a parsed value.
+
+        Uses an index on the attribute when it supports `op`, otherwise scans the column.
+        """
+        entry = self._indexes.get(attribute)
+        if entry is not None and op in entry[1].operators:
+            return sorted(entry[1].search(op, value))  # Ids grow with table order
+        if attribute not in self.schema.names:
+            raise ValueError(f"Attribute '{attribute}' not found in table '{self.name}'.")
+        if op not in COMPARISONS:
+            raise ValueError(f"Unknown comparison operator: {op}")
+        compare = COMPARISONS[op]
+        values = self._live_values(self.schema.names.index(attribute))
+        return [row_id for row_id, current in zip(self.row_ids(), values)
+                if current is not None and compare(current, value)]
+
+    def find(self, conditions=(), after_id: int = None):
+        """Yield (row id, values) in table order for live rows past `after_id` matching every condition.
+
+        Conditions are (attribute, op, parsed value) triples. One condition
+        answered by an index (equality first) narrows the candidates; the
+        others are checked row by row.
+        """
+        tests = []
+        indexed = None
+        _compile_conditions(self.schema, conditions)  # Validates every condition up front
+        for attribute, op, value in conditions:
+            entry = self._indexes.get(attribute)
+            usable = entry is not None and op in entry[1].operators
+            if usable and (indexed is None or (op == '=' and indexed[1] != '=')):
+                if indexed is not None:
+                    tests.append(indexed)
+                indexed = (attribute, op, value)
+            else:
+                tests.append((attribute, op, value))
+        matches = _compile_conditions(self.schema, tests)
+
+        def indexed_rows():
+            # Ids grow with table order, so sorted candidates keep it
+            candidates = sorted(self._indexes[indexed[0]][1].search(indexed[1], indexed[2]))
+            if after_id is not None:
+                del candidates[:bisect_right(candidates, after_id)]
+            ids, alive, columns, slots = self._buffers()
+            for row_id in candidates:
+                slot = slots.get(row_id)
+                if slot is not None and slot < len(ids) and alive[slot]:
+                    values = tuple(column.get(slot) for column in columns)
+                    if matches(values):
+                        yield row_id, values
+
+        def scanned_rows():
+            ids, alive, columns, _ = self._buffers()  # Captured together: slots of one layout
+            start = bisect_right(ids, after_id) if after_id is not None else 0
+            for slot in range(start, len(ids)):
+                if alive[slot]:
+                    values = tuple(column.get(slot) for column in columns)
+                    if matches(values):
+                        yield ids[slot], values
+
+        return indexed_rows() if indexed is not None else scanned_rows()
+
+    def snapshot(self) -> TableSnapshot:
+        """Consistent read-only view of the current rows (copy-on-write)."""
+        self._pins += 1
+        return TableSnapshot(self, self._epoch)
+
+    def _release(self, epoch: int):
+        if epoch == self._epoch and self._pins:
+            self._pins -= 1
+
+    def _unshare(self):
+        # Called before changing buffers in place while snapshots read them
+        if self._pins:
+            self._layout += 1
+            self._columns = [column.copy() for column in self._columns]
+            self._alive = bytearray(self._alive)
+            self._layout += 1
+            self._pins = 0
+            self._epoch += 1
+
+    def row_ids(self):
+        """Yield the ids of live rows in table order."""
+        if self._dead:
+            return compress(self._ids, self._alive)
+        return iter(self._ids)
+
+    def iter_values(self):
+        """Yield every row as a tuple of values in schema order."""
+        rows = zip(*[column.values() for column in self._columns])
+        if self._dead:
+            return compress(rows, self._alive)
+        return rows
+
+    def iter_items(self):
+        """Yield (row id, values) pairs in table order."""
+        return zip(self.row_ids(), self.iter_values())
+
+    def _row_values(self, row: Row, trusted: bool) -> tuple:
+        if trusted:
+            # Values were already parsed by the caller
+            if row.names is self.schema.names:
+                return row.values
+            return tuple(row.data.get(name) for name in self.schema.names)
+        return self.schema.parse_row(row.data)
+
+    def _check_new_key(self, values, row_id: int = None):
+        position = self.schema.key_position
+        if position is None:
+            return
+        owner = self._keys.get(values[position])
+        if owner is not None and owner != row_id:
+            raise ValueError(f"Duplicate value {values[position]!r} for primary key {self.schema.primary_key}.")
+
+    def _append(self, values, row_id: int = None) -> int:
+        self._check_new_key(values)
+        if row_id is not None and row_id < self._next_id:
+            raise ValueError(f"Row id {row_id} was already assigned.")
+        appended = 0
+        try:
+            for column, value in zip(self._columns, values):
+                column.append(value)
+                appended += 1
+        except Exception:
+            for column in self._columns[:appended]:
+                column.pop()
+            raise
+        if row_id is None:
+            row_id = self._next_id
+        self._assign_ids(1, row_id)
+        self.version = next_version()
+        if self._listeners:
+            self._notify('insert', row_id=row_id, values=tuple(values))
+        return row_id
+
+    def insert_row(self, row: Row, trusted: bool = False) -> int:
+        """Insert a row and return its stable id."""
+        return self._append(self._row_values(row, trusted))
+
+    def insert_values(self, values, row_id: int = None) -> int:
+        """Trusted insert of already-parsed values given in schema order.
+
+        `row_id` re-inserts a row under a known id (e.g. when replaying a log);
+        it must not be lower than any id assigned before.
+        """
+        return self._append(values, row_id)
+
+    def insert_many(self, rows, trusted: bool = False) -> int:
+        """Insert a batch of Rows (or plain mappings) all-or-nothing.
+
+        Every row is validated before anything is stored; if any fail, a
+        BulkInsertError listing each failing row is raised and the table is
+        left unchanged. Returns the number of inserted rows.
+        """
+        batch = []
+        errors = []
+        position_of_key = self.schema.key_position
+        batch_keys = set()
+        for position, row in enumerate(rows):
+            if not isinstance(row, Row):
+                row = Row(row)
+            try:
+                values = self._row_values(row, trusted)
+                if position_of_key is not None:
+                    self._check_new_key(values)
+                    if values[position_of_key] in batch_keys:
+                        raise ValueError(f"Duplicate value {values[position_of_key]!r} "
+                                         f"for primary key {self.schema.primary_key}.")
+                    batch_keys.add(values[position_of_key])
+                batch.append(values)
+            except ValueError as e:
+                errors.append((position, str(e)))
+        if errors:
+            raise BulkInsertError(errors)
+
+        start = len(self._ids)
+        position = 0
+        try:
+            for position, values in enumerate(batch):
+                for column, value in zip(self._columns, values):
+                    column.append(value)
+        except (ValueError, TypeError) as e:
+            for column in self._columns:
+                column.truncate(start)
+            raise BulkInsertError([(position, str(e))])
+        first_id = self._next_id
+        self._assign_ids(len(batch))
+        self.version = next_version()
+        if self._listeners:
+            self._notify('insert_many', first_id=first_id, rows=batch)
+        return len(batch)
+
+    def append_values(self, batch, first_id: int = None):
+        """Trusted, column-wise append of a batch of value tuples; all-or-nothing."""
+        if not batch:
+            return
+        if first_id is not None and first_id < self._next_id:
+            raise ValueError(f"Row id {first_id} was already assigned.")
+        if self.schema.key_position is not None:
+            keys = [values[self.schema.key_position] for values in batch]
+            if len(set(keys)) != len(keys) or any(key in self._keys for key in keys):
+                raise ValueError(f"Duplicate values for primary key {self.schema.primary_key}.")
+        start = len(self._ids)
+        try:
+            for column, values in zip(self._columns, zip(*batch)):
+                column.extend(values)
+        except Exception:
+            for column in self._columns:
+                column.truncate(start)
+            raise
+        if first_id is None:
+            first_id = self._next_id
+        self._assign_ids(len(batch), first_id)
+        self.version = next_version()
+        if self._listeners:
+            self._notify('insert_many', first_id=first_id, rows=list(batch))
+
+    def extend_columns(self, columns: list):
+        """Trusted append of whole column buffers of the same types as this table's columns."""
+        self._check_columns(columns)
+        count = len(columns[0]) if columns else 0
+        if self.schema.key_position is not None:
+            keys = list(columns[self.schema.key_position].values())
+            if len(set(keys)) != len(keys) or any(key in self._keys for key in keys):
+                raise ValueError(f"Duplicate values for primary key {self.schema.primary_key}.")
+        for column, part in zip(self._columns, columns):
+            column.extend_column(part)
+        first_id = self._next_id
+        self._assign_ids(count)
+        self.version = next_version()
+        if self._listeners:
+            self._notify('insert_many', first_id=first_id,
+                         rows=list(zip(*[column.values() for column in columns])))
+
+    def _update_slot(self, slot: int, values):
+        self._unshare()
+        self._check_new_key(values, self._ids[slot])
+        old_values = self._values_at(slot)
+        try:
+            for column, value in zip(self._columns, values):
+                column.set(slot, value)
+        except Exception:
+            for column, value in zip(self._columns, old_values):
+                column.set(slot, value)
+            raise
+        position = self.schema.key_position
+        if position is not None and old_values[position] != values[position]:
+            del self._keys[old_values[position]]
+            self._keys[values[position]] = self._ids[slot]
+        for position, index in self._indexes.values():
+            if old_values[position] != values[position]:
+                index.remove(old_values[position], self._ids[slot])
+                index.add(values[position], self._ids[slot])
+        self.version = next_version()
+        if self._listeners:
+            self._notify('update', row_id=self._ids[slot], values=tuple(values))
+
+    def update_row(self, index: int, row: Row, trusted: bool = False):
+        values = self._row_values(row, trusted)
+        self._update_slot(self._slot(index), values)
+
+    def update_row_by_id(self, row_id: int, row: Row, trusted: bool = False):
+        values = self._row_values(row, trusted)
+        self._update_slot(self._slot_of_id(row_id), values)
+
+    def _delete_slot(self, slot: int):
+        self._unshare()
+        row_id = self._ids[slot]
+        if self.schema.key_position is not None:
+            del self._keys[self._columns[self.schema.key_position].get(slot)]
+        for position, index in self._indexes.values():
+            index.remove(self._columns[position].get(slot), row_id)
+        del self._slots[row_id]
+        self._alive[slot] = 0
+        self._dead += 1
+        self._positions = None
+        if self._dead >= COMPACT_MIN_DEAD and self._dead * 2 >= len(self._ids):
+            self.compact()
+        self.version = next_version()
+        if self._listeners:
+            self._notify('delete', row_id=row_id)
+
+    def delete_row(self, index):
+        # Accepts either a row index or a Row equal to the one to remove
+        if isinstance(index, Row):
+            self.delete_row_by_id(self.id_of(index))
+            return
+        self._delete_slot(self._slot(index))
+
+    def delete_row_by_id(self, row_id: int):
+        self._delete_slot(self._slot_of_id(row_id))
+
+    def compact(self):
+        """Drop tombstoned slots from every buffer; row ids are unchanged."""
+        if not self._dead:
+            return
+        kept = list(compress(range(len(self._ids)), self._alive))
+        self._keep_slots(kept)
+
+    def _keep_slots(self, kept: list):
+        columns = [column.take(kept) for column in self._columns]
+        ids = array('q', [self._ids[slot] for slot in kept])
+        self._layout += 1
+        self._columns = columns
+        self._reset_ids(ids)
+        self._layout += 1
+
+    def _reset_ids(self, ids: array):
+        # Rebuild the slot maps for dense columns whose slot i holds row ids[i]
+        self._ids = ids
+        self._alive = bytearray(b'\x01') * len(ids)
+        self._positions = None
+        self._slots = {row_id: slot for slot, row_id in enumerate(self._ids)}
+        if self.schema.key_position is not None:
+            self._keys = dict(zip(self._columns[self.schema.key_position].values(), self._ids))
+        self._dead = 0
+
+    def deduplicate(self, subset: list = None, keep: str = 'first') -> int:
+        """Remove repeated rows in one pass and return how many were removed.
+
+        Rows are compared on `subset` attributes (all attributes by default);
+        keep='first' or 'last' decides which occurrence survives.
+        """
+        if keep not in ('first', 'last'):
+            raise ValueError(f"keep must be 'first' or 'last', got {keep!r}.")
+        self.compact()  # Positions of the live rows below are then their slots
+        if subset:
+            try:
+                key_columns = [self.column(name) for name in subset]
+            except KeyError as e:
+                raise ValueError(e.args[0]) from None
+        else:
+            key_columns = self.columns
+
+        def keys():
+            return zip(*[column.values() for column in key_columns])
+
+        if keep == 'first':
+            seen = set()
+            kept = []
+            for index, key in enumerate(keys()):
+                if key not in seen:
+                    seen.add(key)
+                    kept.append(index)
+        else:
+            last = {}
+            for index, key in enumerate(keys()):
+                last[key] = index
+            kept = [index for index, key in enumerate(keys()) if last[key] == index]
+
+        removed = self.row_count() - len(kept)
+        if removed:
+            removed_ids = None
+            self.version = next_version()
+            if self._listeners:
+                kept_ids = {self._ids[slot] for slot in kept}
+                removed_ids = [row_id for row_id in self._ids if row_id not in kept_ids]
+            self._keep_slots(kept)
+            self._rebuild_indexes()
+            if removed_ids is not None:
+                self._notify('delete_many', row_ids=removed_ids)
+        return removed
+
+    def _rebuild_indexes(self):
+        for attribute, (position, index) in self._indexes.items():
+            rebuilt = type(index)(attribute)
+            rebuilt.bulk_load(self._live_values(position), self.row_ids())
+            self._indexes[attribute] = (position, rebuilt)
+
+    def id_of(self, row: Row) -> int:
+        for row_id, values in self.iter_items():
+            if Row.from_values(self.schema.names, values) == row:
+                return row_id
+        raise ValueError("Row not found in table.")
@@ -0,0 +1,230 @@
+# table_view.py
+import tkinter as tk
+from array import array
+from bisect import bisect_left
+from tkinter import ttk
+
+from indexes import COMPARISONS
+from query import parse_predicate
+from table import Table
+
+# A Treeview only ever holds the rows scrolled into view. What is shown, and
+# in which order, is a list of row ids computed from the table's columns, so
+# sorting and filtering never touch the widget; values are fetched for a
+# buffer of rows around the visible window as the user scrolls. Tree items
+# are identified by stable row ids, and single-row changes reported by the
+# table are patched into the id list instead of recomputing it.
+
+
+def _sort_key(value):
+    return value is None, value  # None sorts after every value
+
+
+def ordered_ids(table: Table, conditions=(), sort_by: str = None, descending: bool = False) -> array:
+    """Row ids matching every (attribute, op, parsed value) condition, optionally sorted by one attribute."""
+    if conditions:
+        ids = array('q', (row_id for row_id, _ in table.find(conditions)))
+    else:
+        ids = array('q', table.row_ids())
+    if sort_by is not None:
+        keys = dict(zip(table.row_ids(), table.column(sort_by).values()))
+        ordered = sorted(ids, key=lambda row_id: _sort_key(keys[row_id]), reverse=descending)
+        ids = array('q', ordered)
+    return ids
+
+
+def insert_position(table: Table, row_ids, row_id: int, values, sort_by: str = None,
+                    descending: bool = False) -> int:
+    """Where a row belongs in ids ordered by ordered_ids(), found by binary search."""
+    if sort_by is None:
+        return bisect_left(row_ids, row_id)  # Ids grow with table order
+    position = table.schema.names.index(sort_by)
+    key = _sort_key(values[position])
+    lo, hi = 0, len(row_ids)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        other = _sort_key(table.get_row_by_id(row_ids[mid]).values[position])
+        # Rows with equal keys keep table order in both directions, as sorted() does
+        if (other > key if descending else other < key) or (other == key and row_ids[mid] < row_id):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def parse_conditions(table: Table, text: str) -> list:
+    """Conditions from filter text such as "age>=30; name=Ann" (see query.parse_predicate)."""
+    return [parse_predicate(part).condition(table.schema) for part in text.split(';') if part.strip()]
+
+
+class VirtualTableView(ttk.Frame):
+    """Scrollable view of a table that renders only the visible rows."""
+
+    def __init__(self, master, table: Table, visible_rows: int = 25, buffer_rows: int = 200, on_change=None):
+        super().__init__(master)
+        self.table = table
+        self.on_change = on_change  # Called after a table change has been applied to the view
+        self.visible_rows = visible_rows
+        self.buffer_rows = buffer_rows
+        self.conditions = []
+        self.sort_by = None
+        self.descending = False
+        self.offset = 0  # Position (in self.row_ids) of the first visible row
+        self.row_ids = array('q')
+        self._buffer = {}  # Row id -> values, for rows around the visible window
+        self._buffer_range = (0, 0)
+
+        columns = list(table.schema.names)
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', height=visible_rows)
+        for col in columns:
+            self.tree.heading(col, text=col, command=lambda col=col: self.toggle_sort(col))
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.tree.bind(sequence, self._on_wheel)
+        self.tree.bind('<Prior>', lambda event: self._scroll_by(-self.visible_rows) or 'break')
+        self.tree.bind('<Next>', lambda event: self._scroll_by(self.visible_rows) or 'break')
+
+        self.reload()
+        table.subscribe(self._on_table_change)
+        self.bind('<Destroy>', lambda event: event.widget is self and table.unsubscribe(self._on_table_change))
+
+    def reload(self):
+        """Recompute the displayed ids from the table, keeping the current filter and sort order."""
+        self.row_ids = ordered_ids(self.table, self.conditions, self.sort_by, self.descending)
+        self._buffer = {}
+        self._buffer_range = (0, 0)
+        self.render()
+
+    def set_filter(self, text: str):
+        """Show only rows matching the filter text; raises ValueError for an invalid filter."""
+        self.conditions = parse_conditions(self.table, text)
+        self.offset = 0
+        self.reload()
+
+    def toggle_sort(self, attribute: str):
+        if self.sort_by == attribute:
+            self.descending = not self.descending
+        else:
+            self.sort_by, self.descending = attribute, False
+        for col in self.table.schema.names:
+            arrow = (' ▼' if self.descending else ' ▲') if col == attribute else ''
+            self.tree.heading(col, text=col + arrow)
+        self.reload()
+
+    def row_count(self) -> int:
+        return len(self.row_ids)
+
+    def _values(self, position: int) -> tuple:
+        start, stop = self._buffer_range
+        if not start <= position < stop or self.row_ids[position] not in self._buffer:
+            # Fetch the visible window plus a buffer on each side in one go
+            start = max(0, position - self.buffer_rows)
+            stop = min(len(self.row_ids), position + self.visible_rows + self.buffer_rows)
+            self._buffer = {row_id: self.table.get_row_by_id(row_id).values
+                            for row_id in self.row_ids[start:stop]}
+            self._buffer_range = (start, stop)
+        return self._buffer[self.row_ids[position]]
+
+    def render(self):
+        total = len(self.row_ids)
+        self.offset = max(0, min(self.offset, total - self.visible_rows))
+        self.tree.delete(*self.tree.get_children())
+        stop = min(total, self.offset + self.visible_rows)
+        for position in range(self.offset, stop):
+            values = ['' if value is None else value for value in self._values(position)]
+            self.tree.insert('', tk.END, iid=str(self.row_ids[position]), values=values)
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        total = len(self.row_ids)
+        if total:
+            self.scrollbar.set(self.offset / total, min(total, self.offset + self.visible_rows) / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _scroll_by(self, rows: int):
+        self.offset += rows
+        self.render()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.offset = int(float(amount) * len(self.row_ids))
+            self.render()
+        elif action == 'scroll':
+            step = self.visible_rows if unit == 'pages' else 1
+            self._scroll_by(int(amount) * step)
+
+    def _on_wheel(self, event):
+        if event.num == 4 or getattr(event, 'delta', 0) > 0:
+            self._scroll_by(-3)
+        else:
+            self._scroll_by(3)
+        return 'break'
+
+    def _matches(self, values) -> bool:
+        for attribute, op, value in self.conditions:
+            current = values[self.table.schema.names.index(attribute)]
+            if current is None or not COMPARISONS[op](current, value):
+                return False
+        return True
+
+    def _insert_position(self, row_id: int, values) -> int:
+        return insert_position(self.table, self.row_ids, row_id, values, self.sort_by, self.descending)
+
+    def _remove_id(self, row_id: int) -> int:
+        if self.sort_by is None:
+            position = bisect_left(self.row_ids, row_id)
+            if position == len(self.row_ids) or self.row_ids[position] != row_id:
+                return -1
+        else:
+            try:
+                position = self.row_ids.index(row_id)
+            except ValueError:
+                return -1
+        del self.row_ids[position]
+        self._buffer.pop(row_id, None)
+        return position
+
+    def _on_table_change(self, table, event: str, data: dict):
+        if event not in ('insert', 'update', 'delete'):
+            self.reload()  # Bulk changes and schema changes
+        else:
+            row_id = data['row_id']
+            visible = self.tree.exists(str(row_id))
+            if event == 'update':
+                values = data['values']
+                if row_id in self._buffer:
+                    self._buffer[row_id] = values
+                if self.conditions or self.sort_by is not None:
+                    # Filter membership or sort position may have changed
+                    self._remove_id(row_id)
+                    if self._matches(values):
+                        self.row_ids.insert(self._insert_position(row_id, values), row_id)
+                    self.render()
+                elif visible:
+                    # Only the edited item changes
+                    self.tree.item(str(row_id), values=['' if value is None else value for value in values])
+            elif event == 'insert':
+                if self._matches(data['values']):
+                    position = self._insert_position(row_id, data['values'])
+                    self.row_ids.insert(position, row_id)
+                    if position < self.offset + self.visible_rows:
+                        self.render()
+                    else:
+                        self._update_scrollbar()
+            else:
+                position = self._remove_id(row_id)
+                if visible or 0 <= position < self.offset:
+                    self.render()
+                else:
+                    self._update_scrollbar()
+        if self.on_change is not None:
+            self.on_change()
+
+    def row_id_at(self, y: int):
+        """Row id under a y coordinate of the tree, or None."""
+        item = self.tree.identify_row(y)
+        return int(item) if item else None
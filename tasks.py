@@ -0,0 +1,128 @@
+# tasks.py
+import queue
+import threading
+import tkinter as tk
+from tkinter import messagebox, ttk
+
+# Long operations of the desktop app (exports, table products) run in a worker
+# thread. The worker never touches Tk: it puts its progress and outcome on a
+# queue that the main loop polls with after(), so widgets, and listeners of
+# tables a result is added to, only ever run on the Tk thread.
+
+POLL_INTERVAL_MS = 50
+
+
+class TaskCancelled(Exception):
+    """Raised inside a task by report() once the task has been cancelled."""
+
+
+class BackgroundTask:
+    """Runs work(task) in a daemon thread; its messages are collected with poll()."""
+
+    def __init__(self, work):
+        self._work = work
+        self._messages = queue.Queue()
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='background-task', daemon=True)
+
+    def start(self) -> 'BackgroundTask':
+        self._thread.start()
+        return self
+
+    def join(self, timeout: float = None):
+        self._thread.join(timeout)
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def report(self, done: int, total: int):
+        """Progress from the worker; raises TaskCancelled once cancel() was called."""
+        if self._cancel.is_set():
+            raise TaskCancelled()
+        self._messages.put(('progress', (done, total)))
+
+    def _run(self):
+        try:
+            result = self._work(self)
+        except TaskCancelled:
+            self._messages.put(('cancelled', None))
+        except Exception as e:
+            self._messages.put(('error', e))
+        else:
+            self._messages.put(('done', result))
+
+    def poll(self) -> list:
+        """(kind, payload) messages queued since the last poll; kind is progress, done, error or cancelled."""
+        messages = []
+        while True:
+            try:
+                messages.append(self._messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+
+class TaskRunner:
+    """Runs one BackgroundTask at a time behind a modal progress dialog with a Cancel button."""
+
+    def __init__(self, root):
+        self.root = root
+        self.task = None
+
+    @property
+    def busy(self) -> bool:
+        return self.task is not None
+
+    def run(self, title: str, work, on_done, on_error=None):
+        """Start work(task) in the background; on_done(result) or on_error(exception) run on the Tk thread."""
+        if self.busy:
+            raise ValueError("Another task is still running.")
+        dialog = tk.Toplevel(self.root)
+        dialog.title(title)
+        dialog.transient(self.root)
+        dialog.resizable(False, False)
+        status = ttk.Label(dialog, text=f"{title}...")
+        status.pack(padx=20, pady=(15, 5))
+        bar = ttk.Progressbar(dialog, length=300, mode='indeterminate', maximum=100)
+        bar.pack(padx=20, pady=5)
+        cancel_button = ttk.Button(dialog, text="Cancel", command=lambda: self._cancel(status, cancel_button))
+        cancel_button.pack(pady=(5, 15))
+        dialog.protocol("WM_DELETE_WINDOW", lambda: self._cancel(status, cancel_button))
+        dialog.grab_set()  # The main window takes no input, so no conflicting edits, until the task ends
+        bar.start()
+
+        self.task = BackgroundTask(work).start()
+        self.root.after(POLL_INTERVAL_MS, self._poll, dialog, bar, status, on_done, on_error)
+
+    def _cancel(self, status, cancel_button):
+        if self.task is not None:
+            self.task.cancel()
+            status.config(text="Cancelling...")
+            cancel_button.state(['disabled'])
+
+    def _poll(self, dialog, bar, status, on_done, on_error):
+        for kind, payload in self.task.poll():
+            if kind == 'progress':
+                done, total = payload
+                if total and not self.task.cancelled:
+                    if str(bar['mode']) != 'determinate':
+                        bar.stop()
+                        bar.config(mode='determinate')
+                    bar['value'] = 100 * done / total
+                    status.config(text=f"{done:,} of {total:,} rows")
+                continue
+            self.task = None
+            dialog.grab_release()
+            dialog.destroy()
+            if kind == 'done':
+                on_done(payload)
+            elif kind == 'error':
+                if on_error is not None:
+                    on_error(payload)
+                else:
+                    messagebox.showerror("Error", str(payload))
+            return
+        self.root.after(POLL_INTERVAL_MS, self._poll, dialog, bar, status, on_done, on_error)
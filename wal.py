@@ -0,0 +1,333 @@
+# wal.py
+import datetime
+import json
+import logging
+import os
+import threading
+import uuid
+import zlib
+from contextlib import contextmanager
+
+from attributes import Attribute
+from database import Database
+from persistence import save_all, load_all, catalog_lsn, save_table, load_table, TABLE_SUFFIX
+from row import Row
+from schema import Schema
+from table import Table
+
+# Append-only log of logical changes, one line per record:
+#
+#   crc32 of the JSON (8 hex digits) | space | JSON record | newline
+#
+# Every record carries a log sequence number (lsn). A checkpoint writes a full
+# snapshot that remembers the last lsn it contains and then empties the log, so
+# recovery is: load the snapshot, replay the records with a higher lsn.
+
+WAL_FILE = 'wal.log'
+
+# group: a request returns once its records are fsynced; concurrent requests share one fsync
+# async: records are fsynced in the background; a crash may lose the last few requests
+# off:   records are written without fsync; survives a process crash, not an OS crash
+DURABILITY_MODES = ('group', 'async', 'off')
+
+logger = logging.getLogger(__name__)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.date):
+        return {'$date': value.isoformat()}
+    raise TypeError(f"Cannot log value of type {type(value).__name__}")
+
+
+def _decode_object(obj: dict):
+    if len(obj) == 1 and '$date' in obj:
+        return datetime.date.fromisoformat(obj['$date'])
+    return obj
+
+
+def encode_record(record: dict) -> bytes:
+    payload = json.dumps(record, default=_encode_value, ensure_ascii=False,
+                         separators=(',', ':')).encode('utf-8')
+    return b'%08x %s\n' % (zlib.crc32(payload), payload)
+
+
+def read_records(path: str):
+    """Return (records, end) for the intact prefix of a log file.
+
+    Reading stops at the first torn or corrupted line; `end` is the byte
+    offset just past the last intact record.
+    """
+    records = []
+    end = 0
+    if not os.path.exists(path):
+        return records, end
+    with open(path, 'rb') as file:
+        for line in file:
+            if not line.endswith(b'\n') or len(line) < 10:
+                break
+            checksum, payload = line[:8], line[9:-1]
+            try:
+                if int(checksum, 16) != zlib.crc32(payload):
+                    break
+                records.append(json.loads(payload.decode('utf-8'), object_hook=_decode_object))
+            except ValueError:
+                break
+            end += len(line)
+    return records, end
+
+
+class WriteAheadLog:
+    """Log file fed by a single writer thread that flushes pending records in batches (group commit)."""
+
+    def __init__(self, path: str, durability: str = 'group', last_lsn: int = 0):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.path = path
+        self.durability = durability
+        self.last_lsn = last_lsn  # Last lsn handed out
+        self._flushed_lsn = last_lsn  # Last lsn written (and fsynced unless durability is 'off')
+        self._pending = []
+        self._error = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._file = open(path, 'ab')
+        self._writer = threading.Thread(target=self._run, name='wal-writer', daemon=True)
+        self._writer.start()
+
+    def append(self, record: dict) -> int:
+        """Queue a record and return its lsn; see wait_for() to block until it is durable."""
+        with self._cond:
+            if self._closed:
+                raise ValueError("Write-ahead log is closed.")
+            self.last_lsn += 1
+            record['lsn'] = self.last_lsn
+            self._pending.append(encode_record(record))
+            self._cond.notify_all()
+            return self.last_lsn
+
+    def wait_for(self, lsn: int):
+        """Block until `lsn` is durable (a no-op unless durability is 'group')."""
+        if self.durability == 'group':
+            self._wait(lsn)
+
+    def flush(self):
+        """Block until every queued record has been written."""
+        self._wait(self.last_lsn)
+
+    def _wait(self, lsn: int):
+        with self._cond:
+            while self._flushed_lsn < lsn and self._error is None:
+                self._cond.wait()
+            if self._error is not None:
+                raise OSError(f"Write-ahead log failed: {self._error}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, []
+                lsn = self.last_lsn
+            try:
+                # Everything queued while the previous fsync ran goes out in one write and one fsync
+                self._file.write(b''.join(batch))
+                self._file.flush()
+                if self.durability != 'off':
+                    os.fsync(self._file.fileno())
+            except OSError as e:
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._flushed_lsn = lsn
+                self._cond.notify_all()
+
+    def truncate(self):
+        """Empty the log once a checkpoint covers all of it."""
+        self.flush()
+        with self._cond:
+            self._file.truncate(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        self._file.close()
+
+
+def _schema_fields(schema: Schema) -> dict:
+    return {'attributes': [[attr.name, attr.data_type, attr.nullable] for attr in schema.attributes],
+            'primary_key': schema.primary_key}
+
+
+def _schema_from(record: dict) -> Schema:
+    return Schema([Attribute(*attr) for attr in record['attributes']], primary_key=record['primary_key'])
+
+
+def apply_record(databases: dict, record: dict, directory: str):
+    """Redo one logged change on the in-memory databases."""
+    op = record['op']
+    if op == 'create_database':
+        databases[record['db']] = Database(record['db'])
+        return
+    if op == 'rename_database':
+        db = databases.pop(record['db'])
+        db.name = record['new_name']
+        databases[db.name] = db
+        return
+    if op == 'delete_database':
+        del databases[record['db']]
+        return
+
+    db = databases[record['db']]
+    if op == 'create_table':
+        db.create_table(Table(record['table'], _schema_from(record)))
+    elif op == 'attach_table':
+        table = load_table(os.path.join(directory, record['file']))
+        table.name = record['table']
+        db.create_table(table)
+    elif op == 'rename_table':
+        db.rename_table(record['table'], record['new_name'])
+    elif op == 'delete_table':
+        db.drop_table(record['table'])
+    else:
+        table = db.tables[record['table']]
+        if op == 'alter_table':
+            table.schema = _schema_from(record)
+        elif op == 'insert':
+            table.insert_values(tuple(record['values']), row_id=record['row_id'])
+        elif op == 'insert_many':
+            table.append_values([tuple(values) for values in record['rows']], first_id=record['first_id'])
+        elif op == 'update':
+            row = Row.from_values(table.schema.names, tuple(record['values']))
+            table.update_row_by_id(record['row_id'], row, trusted=True)
+        elif op == 'delete':
+            table.delete_row_by_id(record['row_id'])
+        elif op == 'delete_many':
+            for row_id in record['row_ids']:
+                try:
+                    table.delete_row_by_id(row_id)
+                except KeyError:
+                    pass  # Already deleted by an earlier record
+        elif op == 'create_index':
+            table.create_index(record['attribute'], record['kind'])
+        elif op == 'drop_index':
+            table.drop_index(record['attribute'])
+        else:
+            raise ValueError(f"Unknown log record: {op}")
+
+
+class DurableStore:
+    """Snapshot + write-ahead log persistence for a dict of databases.
+
+    Row changes are picked up from Table listeners; catalog changes (databases,
+    table names and schemas) are logged by the caller with log(). Mutations
+    run inside transaction(), which also keeps checkpoints consistent.
+    """
+
+    def __init__(self, databases: dict, directory: str, durability: str = 'group',
+                 checkpoint_interval: float = 60.0, compress: bool = False):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.databases = databases
+        self.directory = directory
+        self.durability = durability
+        self.checkpoint_interval = checkpoint_interval
+        self.compress = compress
+        self.wal = None
+        self.lock = threading.Lock()
+        self._checkpoint_lsn = 0
+        self._stop = threading.Event()
+        self._checkpointer = None
+
+    def open(self):
+        """Recover the latest state: load the snapshot, then replay the log on top of it."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.databases.update(load_all(self.directory))
+        self._checkpoint_lsn = last_lsn = catalog_lsn(self.directory)
+        path = os.path.join(self.directory, WAL_FILE)
+        records, end = read_records(path)
+        for record in records:
+            if record['lsn'] > last_lsn:
+                apply_record(self.databases, record, self.directory)
+                last_lsn = record['lsn']
+        if os.path.exists(path) and os.path.getsize(path) != end:
+            with open(path, 'r+b') as file:  # Drop a torn tail so new records follow intact ones
+                file.truncate(end)
+
+        self.wal = WriteAheadLog(path, self.durability, last_lsn)
+        for db in self.databases.values():
+            for table in db.tables.values():
+                self.watch(db, table)
+        if self.checkpoint_interval:
+            self._checkpointer = threading.Thread(target=self._run_checkpoints, name='checkpointer', daemon=True)
+            self._checkpointer.start()
+
+    @contextmanager
+    def transaction(self):
+        """Serialize a mutation and wait until its log records are durable."""
+        with self.lock:
+            yield
+            lsn = self.wal.last_lsn if self.wal else 0
+        if lsn:
+            self.wal.wait_for(lsn)  # Outside the lock, so other requests join the same fsync
+
+    def log(self, op: str, **fields):
+        if self.wal is not None:
+            self.wal.append({'op': op, **fields})
+
+    def watch(self, db: Database, table: Table):
+        """Log every row and schema change of a table that belongs to `db`."""
+        def listener(table, event, data):
+            if event == 'schema':
+                self.log('alter_table', db=db.name, table=table.name, **_schema_fields(data['schema']))
+            else:
+                self.log(event, db=db.name, table=table.name, **data)
+        table.subscribe(listener)  # Index changes arrive as create_index / drop_index events
+
+    def add_table(self, db: Database, table: Table):
+        """Log a table just added to `db` and start watching it.
+
+        A table that already holds rows (product, join or query results) is
+        written as a side snapshot and the log only references the file.
+        """
+        if self.wal is not None:
+            if table.row_count():
+                file_name = f"attached-{uuid.uuid4().hex}{TABLE_SUFFIX}"
+                save_table(table, os.path.join(self.directory, file_name), compress=self.compress)
+                self.log('attach_table', db=db.name, table=table.name, file=file_name)
+            else:
+                self.log('create_table', db=db.name, table=table.name, **_schema_fields(table.schema))
+        self.watch(db, table)
+
+    def checkpoint(self):
+        """Snapshot everything and truncate the log (side snapshots are dropped by save_all)."""
+        with self.lock:
+            lsn = self.wal.last_lsn
+            self.wal.flush()
+            save_all(self.databases, self.directory, compress=self.compress, wal_lsn=lsn)
+            self.wal.truncate()
+            self._checkpoint_lsn = lsn
+
+    def _run_checkpoints(self):
+        while not self._stop.wait(self.checkpoint_interval):
+            if self.wal.last_lsn > self._checkpoint_lsn:
+                try:
+                    self.checkpoint()
+                except OSError:
+                    logger.exception("Checkpoint failed; changes stay in the write-ahead log.")
+
+    def close(self):
+        self._stop.set()
+        if self._checkpointer is not None:
+            self._checkpointer.join()
+        if self.wal is not None:
+            self.checkpoint()
+            self.wal.close()
+            self.wal = None